@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Dict, Optional
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from config import Config
+from database import (
+    create_broadcast, set_broadcast_status_message, get_unfinished_broadcasts,
+    get_pending_deliveries, mark_delivery, get_broadcast_progress, finish_broadcast
+)
+from metrics import BROADCAST_RETRY_AFTER
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов (token bucket) с паузой по RetryAfter"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Приостанавливает выдачу токенов (Telegram попросил подождать)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BroadcastEngine:
+    """Фоновая рассылка: пул отправителей, общий лимит скорости и прогресс в БД"""
+
+    MAX_NETWORK_RETRIES = 3
+    PROGRESS_INTERVAL = 3.0
+
+    _tasks: Dict[int, asyncio.Task] = {}
+    _bucket: Optional[TokenBucket] = None
+
+    @classmethod
+    def bucket(cls) -> TokenBucket:
+        # Один лимитер на все рассылки — ограничение Telegram общее для бота
+        if cls._bucket is None:
+            cls._bucket = TokenBucket(Config.BROADCAST_RATE)
+        return cls._bucket
+
+    @classmethod
+    async def launch(cls, bot: Bot, text: str, photo: Optional[str], status_chat_id: int) -> int:
+        """Создаёт рассылку, отправляет сообщение о прогрессе и запускает её в фоне"""
+        broadcast_id = await create_broadcast(text, photo)
+        status = await bot.send_message(
+            chat_id=status_chat_id,
+            text=f"📢 Рассылка #{broadcast_id} запущена..."
+        )
+        await set_broadcast_status_message(broadcast_id, status.chat_id, status.message_id)
+        cls.start(bot, broadcast_id, text, photo, status.chat_id, status.message_id)
+        return broadcast_id
+
+    @classmethod
+    def start(cls, bot: Bot, broadcast_id: int, text: str, photo: Optional[str],
+              status_chat_id: Optional[int], status_message_id: Optional[int]) -> asyncio.Task:
+        task = asyncio.create_task(
+            cls._run(bot, broadcast_id, text, photo, status_chat_id, status_message_id)
+        )
+        cls._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: cls._tasks.pop(broadcast_id, None))
+        return task
+
+    @classmethod
+    async def resume_unfinished(cls, bot: Bot):
+        """Продолжает рассылки, прерванные перезапуском бота"""
+        for broadcast_id, text, photo, chat_id, message_id in await get_unfinished_broadcasts():
+            if broadcast_id in cls._tasks:
+                continue
+            logger.info(f"Resuming broadcast #{broadcast_id}")
+            cls.start(bot, broadcast_id, text, photo, chat_id, message_id)
+
+    @classmethod
+    async def stop_all(cls):
+        """Останавливает рассылки; недоставленные получатели остаются в статусе pending"""
+        tasks = list(cls._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @classmethod
+    async def _run(cls, bot: Bot, broadcast_id: int, text: str, photo: Optional[str],
+                   status_chat_id: Optional[int], status_message_id: Optional[int]):
+        queue: asyncio.Queue = asyncio.Queue()
+        for user_id in await get_pending_deliveries(broadcast_id):
+            queue.put_nowait(user_id)
+
+        progress = await get_broadcast_progress(broadcast_id)
+        stats = {"sent": progress.get("sent", 0), "failed": progress.get("failed", 0)}
+        total = sum(progress.values())
+        retries: Dict[int, int] = {}
+
+        async def report(final: bool = False):
+            if not status_chat_id or not status_message_id:
+                return
+            if final:
+                text_ = (
+                    f"✅ Рассылка завершена!\n\n"
+                    f"Успешно: {stats['sent']}\n"
+                    f"Ошибок: {stats['failed']}"
+                )
+                markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 В меню", callback_data="start_over")]])
+            else:
+                text_ = (
+                    f"📢 Рассылка #{broadcast_id}\n\n"
+                    f"Доставлено: {stats['sent']} из {total}\n"
+                    f"Ошибок: {stats['failed']}\n"
+                    f"В очереди: {queue.qsize()}"
+                )
+                markup = None
+            try:
+                await bot.edit_message_text(
+                    chat_id=status_chat_id,
+                    message_id=status_message_id,
+                    text=text_,
+                    reply_markup=markup
+                )
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    logger.warning(f"Broadcast #{broadcast_id} progress update failed: {e}")
+            except Exception as e:
+                logger.warning(f"Broadcast #{broadcast_id} progress update failed: {e}")
+
+        async def deliver(user_id: int):
+            await cls.bucket().acquire()
+            try:
+                if photo:
+                    await bot.send_photo(chat_id=user_id, photo=photo, caption=text if text else None)
+                else:
+                    await bot.send_message(chat_id=user_id, text=text)
+            except RetryAfter as e:
+                BROADCAST_RETRY_AFTER.inc()
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                logger.warning(f"FloodWait: пауза рассылки на {delay} секунд")
+                cls.bucket().pause(delay)
+                queue.put_nowait(user_id)
+                return
+            except (Forbidden, BadRequest) as e:
+                # Бот заблокирован или чат недоступен — повтор не поможет
+                stats["failed"] += 1
+                await mark_delivery(broadcast_id, user_id, "failed", str(e))
+                return
+            except NetworkError as e:
+                retries[user_id] = retries.get(user_id, 0) + 1
+                if retries[user_id] <= cls.MAX_NETWORK_RETRIES:
+                    queue.put_nowait(user_id)
+                    return
+                stats["failed"] += 1
+                await mark_delivery(broadcast_id, user_id, "failed", str(e))
+                return
+            except Exception as e:
+                logger.error(f"Не удалось отправить сообщение {user_id}: {e}")
+                stats["failed"] += 1
+                await mark_delivery(broadcast_id, user_id, "failed", str(e))
+                return
+            stats["sent"] += 1
+            await mark_delivery(broadcast_id, user_id, "sent")
+
+        async def worker():
+            while True:
+                user_id = await queue.get()
+                try:
+                    await deliver(user_id)
+                except Exception as e:
+                    logger.error(f"Broadcast #{broadcast_id} worker error for {user_id}: {e}")
+                finally:
+                    queue.task_done()
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(cls.PROGRESS_INTERVAL)
+                await report()
+
+        workers = [asyncio.create_task(worker()) for _ in range(Config.BROADCAST_WORKERS)]
+        progress_task = asyncio.create_task(reporter())
+        try:
+            await queue.join()
+        finally:
+            for task in workers + [progress_task]:
+                task.cancel()
+            await asyncio.gather(*workers, progress_task, return_exceptions=True)
+
+        await finish_broadcast(broadcast_id)
+        await report(final=True)
+        logger.info(f"Broadcast #{broadcast_id} finished: sent={stats['sent']}, failed={stats['failed']}")
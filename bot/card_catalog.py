@@ -0,0 +1,83 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot.router import pack, unpack
+from bot.screens import Screen
+
+# m:<id>:<0|1> — компактный callback_data вместо названия карты
+CALLBACK_ACTION = "m"
+# Старый формат из уже отправленных сообщений: meaning_<название>_<0|1>
+LEGACY_CALLBACK_PATTERN = r"^meaning_.+_[01]$"
+
+_LEGACY_RE = re.compile(r"^meaning_(.+)_([01])$")
+
+
+class CardCatalog:
+    """Скомпилированный справочник карт: целочисленный id и готовые экраны значений.
+
+    id карты — её позиция в колоде. После compile() для каждой карты и
+    каждого положения хранится готовый текст и клавиатура с переключателем,
+    так что показ значения — одно обращение к списку.
+    """
+
+    def __init__(self, cards: Iterable[str]):
+        self.names: List[str] = list(cards)
+        self.ids: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self._screens: List[Optional[Tuple[Screen, Screen]]] = []
+
+    @property
+    def compiled(self) -> bool:
+        return bool(self._screens)
+
+    @staticmethod
+    def callback(card_id: int, is_reversed: bool = False) -> str:
+        return pack(CALLBACK_ACTION, card_id, int(is_reversed))
+
+    def callback_for(self, card_name: str, is_reversed: bool = False) -> str:
+        return self.callback(self.ids[card_name], is_reversed)
+
+    def parse_callback(self, data: str) -> Optional[Tuple[int, bool]]:
+        """(id карты, перевёрнута ли) из callback_data нового или старого формата"""
+        action, args = unpack(data)
+        if action == CALLBACK_ACTION:
+            if len(args) == 2 and args[0].isdigit() and int(args[0]) < len(self.names):
+                return int(args[0]), args[1] == "1"
+            return None
+        match = _LEGACY_RE.match(data)
+        if match and match.group(1) in self.ids:
+            return self.ids[match.group(1)], match.group(2) == "1"
+        return None
+
+    def compile(self, meanings: Dict[str, dict]):
+        """Готовит тексты и клавиатуры для всех карт в обоих положениях"""
+        home = [InlineKeyboardButton("🏠 На главную", callback_data="start_over")]
+        screens = []
+        for card_id, card_name in enumerate(self.names):
+            card_data = meanings.get(card_name)
+            if not card_data:
+                screens.append(None)
+                continue
+            pair = []
+            for is_reversed in (False, True):
+                position = "Перевернутое" if is_reversed else "Прямое"
+                text = (
+                    f"✨ *{card_name}* ({position} положение)\n"
+                    f"🏷️ Категория: {card_data.get('category', '?')}\n\n"
+                    f"📖 *Значение:*\n{card_data.get('meaning', 'Нет данных')}\n\n"
+                    f"🔮 *{position} положение:*\n"
+                    f"{card_data.get('reversed' if is_reversed else 'upright', 'Нет данных')}"
+                )
+                toggle = InlineKeyboardButton(
+                    "🔄 Показать " + ("прямое" if is_reversed else "перевернутое"),
+                    callback_data=self.callback(card_id, not is_reversed)
+                )
+                pair.append(Screen(text, InlineKeyboardMarkup([[toggle], home]), "Markdown"))
+            screens.append(tuple(pair))
+        self._screens = screens
+
+    def screen(self, card_id: int, is_reversed: bool = False) -> Optional[Screen]:
+        """Экран значения карты или None, если карты нет в data/card_meanings.json"""
+        pair = self._screens[card_id]
+        return pair[int(is_reversed)] if pair else None
@@ -0,0 +1,148 @@
+import difflib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import unidecode
+
+
+def normalize_card_name(name: str) -> str:
+    name = name.strip().lower()
+    name = name.replace("ё", "е")
+    name = unidecode.unidecode(name)
+    return name
+
+
+# Номера младших арканов — для форм вида "2 Кубков"
+RANKS = {
+    "Туз": 1, "Двойка": 2, "Тройка": 3, "Четверка": 4, "Пятерка": 5,
+    "Шестерка": 6, "Семерка": 7, "Восьмерка": 8, "Девятка": 9, "Десятка": 10,
+}
+
+# Распространённые альтернативные названия из других переводов колоды
+WORD_ALIASES = {
+    "Паж": ["Валет"],
+    "Королева": ["Дама"],
+    "Жезлов": ["Посохов"],
+    "Кубков": ["Чаш"],
+    "Пентаклей": ["Монет", "Денариев"],
+}
+
+CARD_ALIASES = {
+    "Верховная Жрица": ["Жрица"],
+    "Иерофант": ["Верховный Жрец"],
+    "Колесо Фортуны": ["Фортуна"],
+    "Суд": ["Страшный Суд"],
+}
+
+
+def card_aliases(card: str) -> List[str]:
+    """Альтернативные написания карты: цифровая форма и синонимы"""
+    aliases = list(CARD_ALIASES.get(card, []))
+    words = card.split()
+    if len(words) == 2:
+        rank, suit = words
+        ranks = [rank] + WORD_ALIASES.get(rank, [])
+        suits = [suit] + WORD_ALIASES.get(suit, [])
+        if rank in RANKS:
+            ranks.append(str(RANKS[rank]))
+        aliases.extend(f"{r} {s}" for r in ranks for s in suits if (r, s) != (rank, suit))
+    return aliases
+
+
+class CardNameIndex:
+    """Индекс названий карт, построенный один раз.
+
+    Ключи — нормализованные (латинская транслитерация через unidecode)
+    названия и их синонимы. Точный поиск — обращение к словарю, подстрока
+    и нечёткий поиск проверяют только кандидатов из таблицы n-грамм.
+    Синонимы участвуют только в точном поиске. Если у опечатки не нашлось
+    ни одного кандидата с нужным ratio (сильно искажённое слово может не
+    иметь общих n-грамм с названием), нечёткий поиск перебирает всю колоду,
+    как difflib.get_close_matches.
+    """
+
+    NGRAM = 3
+
+    def __init__(self, cards: Iterable[str]):
+        self.cards = list(cards)
+        self._order = {card: i for i, card in enumerate(self.cards)}
+        self._keys: Dict[str, str] = {}
+        for card in self.cards:
+            self._keys.setdefault(normalize_card_name(card), card)
+        self._names = set(self._keys)
+        for card in self.cards:
+            for alias in card_aliases(card):
+                self._keys.setdefault(normalize_card_name(alias), card)
+
+        self._ngrams: Dict[str, Set[str]] = defaultdict(set)
+        for key in self._keys:
+            for gram in self._grams(key, padded=True):
+                self._ngrams[gram].add(key)
+
+    @classmethod
+    def _grams(cls, text: str, padded: bool = False) -> Set[str]:
+        if padded:
+            text = f"^{text}$"
+        return {text[i:i + cls.NGRAM] for i in range(len(text) - cls.NGRAM + 1)}
+
+    def _in_deck_order(self, cards: Iterable[str]) -> List[str]:
+        return sorted(set(cards), key=self._order.__getitem__)
+
+    def exact(self, text: str) -> Optional[str]:
+        return self._keys.get(normalize_card_name(text))
+
+    def substring(self, text: str) -> List[str]:
+        """Карты, в нормализованном названии которых есть text"""
+        query = normalize_card_name(text)
+        grams = self._grams(query)
+        if grams:
+            candidates = set.intersection(*(self._ngrams.get(g, set()) for g in grams)) & self._names
+        else:
+            candidates = self._names
+        return self._in_deck_order(self._keys[key] for key in candidates if query in key)
+
+    def fuzzy(self, text: str, min_ratio: float = 0.7) -> List[Tuple[float, str]]:
+        """Пары (ratio, ключ) с ratio >= min_ratio, лучшие первыми"""
+        query = normalize_card_name(text)
+        if len(query) <= 2 * self.NGRAM:
+            # У коротких строк с опечаткой может не быть общих n-грамм
+            return self._score(query, self._names, min_ratio)
+        candidates = set()
+        for gram in self._grams(query, padded=True):
+            candidates |= self._ngrams.get(gram, set())
+        return (self._score(query, candidates & self._names, min_ratio)
+                or self._score(query, self._names, min_ratio))
+
+    @staticmethod
+    def _score(query: str, candidates: Iterable[str], min_ratio: float) -> List[Tuple[float, str]]:
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        scored = []
+        for key in candidates:
+            matcher.set_seq1(key)
+            if matcher.real_quick_ratio() >= min_ratio and matcher.quick_ratio() >= min_ratio:
+                ratio = matcher.ratio()
+                if ratio >= min_ratio:
+                    scored.append((ratio, key))
+        scored.sort(reverse=True)
+        return scored
+
+    def match(self, text: str, min_ratio: float = 0.7) -> Tuple[str, bool]:
+        """Лучшее совпадение: (название карты, найдено ли)"""
+        card = self.exact(text)
+        if card:
+            return card, True
+        scored = self.fuzzy(text, min_ratio)
+        if scored:
+            return self._keys[scored[0][1]], True
+        return text, False
+
+    def search(self, text: str, min_ratio: float = 0.7) -> List[str]:
+        """Все подходящие карты: точные и нечёткие совпадения, иначе — по подстроке"""
+        found = [self._keys[key] for _, key in self.fuzzy(text, min_ratio)]
+        card = self.exact(text)
+        if card:
+            found.append(card)
+        if found:
+            return self._in_deck_order(found)
+        return self.substring(text)
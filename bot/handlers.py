@@ -3,19 +3,29 @@ from telegram.ext import ContextTypes, ConversationHandler
 from config import Config
 import logging
 from database import (
-    add_user, get_user, get_attempts, update_attempts,
-    get_active_subscription, save_reading, add_subscription,
-    execute_query, cancel_subscription
+    add_user, get_user, update_attempts, save_reading, add_subscription,
+    execute_query, cancel_subscription, get_entitlement, consume_attempt,
+    get_dashboard_stats, get_daily_stats, get_users_page, get_user_details
 )
 
-from tarot_interpreter import TarotInterpreter
-from datetime import datetime
+from tarot_interpreter import TarotInterpreter, ERROR_UNAVAILABLE
+from bot.media import MediaRegistry
+from bot.broadcast import BroadcastEngine
+from bot.jobs import InterpretationQueue, InterpretationJob, PLACEHOLDER_TEXT
+from bot.pregeneration import ReadingPregenerator, DAILY_QUESTION, WEEKLY_QUESTION
+from bot.interpretation_cache import InterpretationCache
+from bot.template_interpreter import TemplateInterpreter, FALLBACK_NOTE, REASON_BUSY, REASON_UNAVAILABLE
+from bot.profiling import Profiler, CPROFILE_NOTE
+from datetime import datetime, timedelta, timezone
 import html
 import random
-import asyncio
-from telegram.error import BadRequest, RetryAfter
-import difflib
-import unidecode
+from telegram.error import BadRequest
+from bot.card_index import CardNameIndex
+from bot.screens import Screen, ScreenRegistry, build_keyboard
+from bot.card_catalog import CardCatalog
+from bot.router import pack, unpack
+import re
+from typing import Optional
 
 CARDS_IMAGE = "cards_back.png"
 PICK_CARDS = 9000
@@ -41,6 +51,7 @@ def main_menu_buttons():
         ("🃏 Дневной расклад", "daily_reading"),
         ("🃏 Недельный расклад", "weekly_reading"),
         ("🃏 Запросить расклад", "request_reading"),
+        ("⚡ Быстрый расклад", "quick_reading"),
         ("💎 Подписка", "subscription"),
         ("📜 Значения карт", "card_meanings"),
         ("📞 Консультация", "consultation"),
@@ -52,7 +63,7 @@ def primary_menu_keyboard(columns: int = 2) -> InlineKeyboardMarkup:
     return BaseHandler.create_keyboard(main_menu_buttons(), columns=columns)
 
 def ok_keyboard():
-    return BaseHandler.create_keyboard([("🏠 На главную", "start_over")])
+    return SCREENS.keyboard("home")
 
 def back_keyboard(cb="start_over"):
     return BaseHandler.create_keyboard([("🔙 Назад", cb)])
@@ -100,23 +111,130 @@ TAROT_DECK = [
 
 # --- Универсальная функция сопоставления ---
 
-def normalize_card_name(name: str) -> str:
-    name = name.strip().lower()
-    name = name.replace("ё", "е")
-    name = unidecode.unidecode(name)
-    return name
-
-def match_card_name(user_input, card_list, min_ratio=0.7):
-    input_norm = normalize_card_name(user_input)
-    deck_norm = [normalize_card_name(c) for c in card_list]
-    if input_norm in deck_norm:
-        idx = deck_norm.index(input_norm)
-        return card_list[idx], True
-    matches = difflib.get_close_matches(input_norm, deck_norm, n=1, cutoff=min_ratio)
-    if matches:
-        idx = deck_norm.index(matches[0])
-        return card_list[idx], True
-    return user_input, False
+# Индекс названий строится один раз при импорте
+CARD_INDEX = CardNameIndex(TAROT_DECK)
+# id карт и готовые экраны значений (экраны — после загрузки значений)
+CARD_CATALOG = CardCatalog(TAROT_DECK)
+
+# --- Статические экраны: тексты и клавиатуры собираются один раз ---
+
+CARD_CATEGORIES = {
+    "major_arcana": "Старшие Арканы",
+    "wands": "Жезлы",
+    "cups": "Кубки",
+    "swords": "Мечи",
+    "pentacles": "Пентакли"
+}
+
+SCREENS = ScreenRegistry()
+
+SCREENS.register(
+    "start",
+    text=(
+        f"🌟 {h('Без лишней магии — только ясность!')} \n\n"
+        "Здесь можно быстро навести порядок в мыслях и получить честный совет — карты не льстят и не пугают, а помогают увидеть суть.\n\n"
+        f"{sep()}\n"
+        f"{bullet(['Быстрые расклады', 'Пакеты попыток и подписка', 'Полная база значений карт', 'Личная консультация'])}\n\n"
+        "Выберите действие ниже:"
+    ),
+    buttons=main_menu_buttons(),
+    parse_mode=PARSE
+)
+
+SCREENS.register(
+    "help",
+    text=(
+        f"{h('Что умеет бот')} \n\n"
+        f"{bullet(['🃏 Расклад — получи честный разбор твоей ситуации',
+                   '⚡ Быстрый расклад — мгновенный разбор по значениям карт, без списания попыток',
+                   '💎 Подписка — неограниченный доступ к раскладам, когда захочешь',
+                   '📜 Значения карт — полная база по каждой карте, без лишних слов',
+                   '📞 Консультация — персональный разбор от опытного таролога'])}\n\n"
+        f"{sep()}\n"
+        f"{h('Советы по формулировке вопросов')}\n"
+        f"{bullet(['Спрашивайте конкретно: «Что мне сделать, чтобы ...?»',
+                   'Добавьте детали ситуации — это повышает точность'])}\n\n"
+        f"{kv('Связаться с поддержкой', f'@{Config.ADMIN_USERNAME}')}\n"
+        "Доступен всегда — отвечу по мере возможности."
+    ),
+    buttons=[
+        ("🃏 Расклад", "request_reading"),
+        ("💎 Подписка", "subscription"),
+        ("📞 Консультация", "consultation"),
+        ("🏠 На главную", "start_over")
+    ],
+    parse_mode=PARSE
+)
+
+SCREENS.register(
+    "categories",
+    text="📜 *Выберите категорию карт для просмотра значений:*",
+    buttons=[
+        ("🃏 Старшие Арканы", "major_arcana"),
+        ("🔥 Жезлы", "wands"),
+        ("💧 Кубки", "cups"),
+        ("⚔️ Мечи", "swords"),
+        ("💰 Пентакли", "pentacles"),
+        ("🔍 Поиск карты", "search_card"),
+        ("🔙 На главную", "start_over")
+    ],
+    parse_mode="Markdown"
+)
+
+SCREENS.register(
+    "subscriptions",
+    buttons=[
+        ("💎 Месячная (349₽)", "sub_monthly"),
+        ("🛒 5 попыток (99₽)", "sub_5"),
+        ("🛒 10 попыток (149₽)", "sub_10"),
+        ("🛒 15 попыток (229₽)", "sub_15"),
+        ("🔙 На главную", "start_over")
+    ]
+)
+
+SCREENS.register(
+    "no_attempts",
+    text="❌ У вас закончились бесплатные попытки.\n"
+         "Приобретите подписку или попытки.",
+    buttons=[
+        ("💎 Подписка", "subscription"),
+        ("🔙 На главную", "start_over")
+    ]
+)
+
+SCREENS.register(
+    "admin",
+    text="⚙️ *Админ-панель*",
+    buttons=[
+        ("👤 Управление пользователями", "admin_users"),
+        ("📊 Аналитика", "admin_analytics"),
+        ("📢 Рассылка", "admin_broadcast"),
+        ("🔙 На главную", "start_over")
+    ],
+    parse_mode="Markdown"
+)
+
+SCREENS.register(
+    "admin_users",
+    text="👥 *Управление пользователями*",
+    buttons=[
+        ("➕ Добавить попытки", "admin_add_attempts"),
+        ("➖ Удалить попытки", "admin_remove_attempts"),
+        ("💎 Добавить подписку", "admin_add_sub"),
+        ("🚫 Аннулировать подписку", "admin_cancel_sub"),
+        ("📋 Список пользователей", "admin_list_users"),
+        ("🔍 Найти по username", "admin_user_search"),
+        ("✉️ Написать пользователю", "admin_send_msg"),
+        ("🔙 Назад", "start_over")
+    ],
+    parse_mode="Markdown"
+)
+
+SCREENS.register("home", buttons=[("🏠 На главную", "start_over")])
+
+def match_card_name(user_input, card_list=None, min_ratio=0.7):
+    index = CARD_INDEX if card_list is None or card_list is TAROT_DECK else CardNameIndex(card_list)
+    return index.match(user_input, min_ratio)
 
 class BaseHandler:
     """Базовый класс с общими методами"""
@@ -124,24 +242,15 @@ class BaseHandler:
     @staticmethod
     async def check_access(telegram_id: int) -> bool:
         """Проверка доступа пользователя к раскладам"""
-        if await get_active_subscription(telegram_id):
+        attempts, has_sub = await get_entitlement(telegram_id)
+        if has_sub:
             return True
-        attempts = await get_attempts(telegram_id)
         return attempts > 0 if attempts is not None else False
 
     @staticmethod
     def create_keyboard(buttons: list, columns: int = 2) -> InlineKeyboardMarkup:
         """Создание inline клавиатуры с автоматическим распределением по колонкам"""
-        keyboard = []
-        row = []
-        
-        for i, (text, data) in enumerate(buttons, 1):
-            row.append(InlineKeyboardButton(text, callback_data=data))
-            if i % columns == 0 or i == len(buttons):
-                keyboard.append(row)
-                row = []
-                
-        return InlineKeyboardMarkup(keyboard)
+        return build_keyboard(buttons, columns)
 
     @staticmethod
     async def back_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -170,22 +279,12 @@ class CardMeaningsHandler(BaseHandler):
     async def process_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Единая корректная версия поиска (без дубликатов)"""
         search_query = update.message.text
-        results = []
-
-        # 1) точное/нечёткое совпадение по всей колоде
-        for card in TAROT_DECK:
-            matched, found = match_card_name(search_query, [card])
-            if found:
-                card_data = TarotInterpreter._card_meanings.get(card, {})
-                results.append((card, card_data.get("category", "Неизвестно")))
 
-        # 2) если не нашли — подстрочный поиск по нормализованному имени
-        if not results:
-            query_norm = normalize_card_name(search_query)
-            for card in TAROT_DECK:
-                if query_norm in normalize_card_name(card):
-                    card_data = TarotInterpreter._card_meanings.get(card, {})
-                    results.append((card, card_data.get("category", "Неизвестно")))
+        # Точное/нечёткое совпадение по всей колоде, иначе — подстрочный поиск
+        results = [
+            (card, TarotInterpreter._card_meanings.get(card, {}).get("category", "Неизвестно"))
+            for card in CARD_INDEX.search(search_query)
+        ]
 
         if not results:
             await update.message.reply_text(
@@ -209,7 +308,7 @@ class CardMeaningsHandler(BaseHandler):
             return ConversationHandler.END
 
         buttons = [
-            [InlineKeyboardButton(f"{card} ({category})", callback_data=f"meaning_{card}_0")]
+            [InlineKeyboardButton(f"{card} ({category})", callback_data=CARD_CATALOG.callback_for(card))]
             for card, category in results
         ]
         buttons.append([InlineKeyboardButton("🔙 Назад", callback_data="card_meanings")])
@@ -227,32 +326,24 @@ class CardMeaningsHandler(BaseHandler):
         query = update.callback_query
         await query.answer()
         
-        buttons = [
-            ("🃏 Старшие Арканы", "major_arcana"),
-            ("🔥 Жезлы", "wands"),
-            ("💧 Кубки", "cups"),
-            ("⚔️ Мечи", "swords"),
-            ("💰 Пентакли", "pentacles"),
-            ("🔍 Поиск карты", "search_card"),
-            ("🔙 На главную", "start_over")
-        ]
+        screen = SCREENS["categories"]
         
         try:
             # Пытаемся отредактировать сообщение
             try:
                 await query.edit_message_text(
-                    text="📜 *Выберите категорию карт для просмотра значений:*",
-                    reply_markup=BaseHandler.create_keyboard(buttons, columns=2),
-                    parse_mode="Markdown"
+                    text=screen.text,
+                    reply_markup=screen.reply_markup,
+                    parse_mode=screen.parse_mode
                 )
             except BadRequest as e:
                 if "There is no text in the message to edit" in str(e):
                     # Если сообщение нельзя отредактировать, отправляем новое
                     await context.bot.send_message(
                         chat_id=query.from_user.id,
-                        text="📜 *Выберите категорию карт для просмотра значений:*",
-                        reply_markup=BaseHandler.create_keyboard(buttons, columns=2),
-                        parse_mode="Markdown"
+                        text=screen.text,
+                        reply_markup=screen.reply_markup,
+                        parse_mode=screen.parse_mode
                     )
                 else:
                     raise  # Пробрасываем другие ошибки BadRequest
@@ -262,57 +353,26 @@ class CardMeaningsHandler(BaseHandler):
                 await context.bot.send_message(
                     chat_id=query.from_user.id,
                     text="⚠️ Произошла ошибка при загрузке категорий. Попробуйте позже.",
-                    reply_markup=BaseHandler.create_keyboard([("🏠 На главную", "start_over")])
+                    reply_markup=SCREENS.keyboard("home")
                 )
             except Exception as send_error:
                 logger.error(f"Failed to send error message: {send_error}")
 
     @staticmethod
-    async def show_cards(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-    
-        # Проверяем загружены ли значения карт
-        if not TarotInterpreter._card_meanings:
-            await query.edit_message_text("🔄 Загружаю значения карт, попробуйте через 2-3 секунды...")
-            await TarotInterpreter.load_meanings()
-        
-        category_map = {
-            "major_arcana": "Старшие Арканы",
-            "wands": "Жезлы",
-            "cups": "Кубки",
-            "swords": "Мечи",
-            "pentacles": "Пентакли"
-        }
-        
-        category_key = query.data
-        category_name = category_map.get(category_key)
-        
-        if not category_name:
-            await query.answer("Категория не найдена")
-            return
+    def build_card_grids():
+        """Собирает сетки карт по категориям и экраны значений (после загрузки значений карт)"""
+        CARD_CATALOG.compile(TarotInterpreter._card_meanings)
         
-        # Получаем и сортируем карты по порядку
-        cards_in_category = [
-            card for card in TAROT_DECK 
-            if TarotInterpreter._card_meanings.get(card, {}).get("category") == category_name
-        ]
+        # Порядок: Туз, придворные карты (Паж, Рыцарь, Королева, Король), затем остальные как в колоде
+        order = {"Туз": 1, "Паж": 11, "Рыцарь": 12, "Королева": 13, "Король": 14}
         
-        # Сортируем карты по порядку (Туз, 2-10, Паж, Рыцарь, Королева, Король)
         def sort_key(card):
             parts = card.split()
             if parts[0].isdigit():
                 return (0, int(parts[0]))
-            order = {"Туз": 1, "Паж": 11, "Рыцарь": 12, "Королева": 13, "Король": 14}
             return (0, order.get(parts[0], 99))
         
-        cards_in_category.sort(key=sort_key)
-        
-        if not cards_in_category:
-            await query.answer("Карты в этой категории не найдены")
-            return
-        
-        # Создаем компактные названия для кнопок
+        # Компактные названия для кнопок
         def get_short_name(full_name):
             # Для числовых карт оставляем только цифру
             if full_name[0].isdigit():
@@ -322,79 +382,62 @@ class CardMeaningsHandler(BaseHandler):
                 return full_name.split()[0]
             return full_name
         
-        # Создаем специальный формат для Пентаклей
-        if category_key == "pentacles":
-            buttons = []
-            # Числовые карты (1-10)
-            for i in range(0, 10, 2):
-                row = []
-                card1 = cards_in_category[i]
-                row.append(InlineKeyboardButton(
-                    get_short_name(card1),
-                    callback_data=f"meaning_{card1}_0"
-                ))
-                if i+1 < 10:
-                    card2 = cards_in_category[i+1]
-                    row.append(InlineKeyboardButton(
-                        get_short_name(card2),
-                        callback_data=f"meaning_{card2}_0"
-                    ))
-                buttons.append(row)
+        for category_key, category_name in CARD_CATEGORIES.items():
+            cards_in_category = sorted(
+                (card for card in TAROT_DECK
+                 if TarotInterpreter._card_meanings.get(card, {}).get("category") == category_name),
+                key=sort_key
+            )
+            if not cards_in_category:
+                continue
             
-            # Придворные карты
-            court_cards = cards_in_category[10:]
-            for i in range(0, len(court_cards), 2):
-                row = []
-                card1 = court_cards[i]
-                row.append(InlineKeyboardButton(
-                    get_short_name(card1),
-                    callback_data=f"meaning_{card1}_0"
-                ))
-                if i+1 < len(court_cards):
-                    card2 = court_cards[i+1]
-                    row.append(InlineKeyboardButton(
-                        get_short_name(card2),
-                        callback_data=f"meaning_{card2}_0"
-                    ))
-                buttons.append(row)
-        else:
-            # Стандартный формат для других категорий
-            buttons = []
-            for i in range(0, len(cards_in_category), 2):
-                row = []
-                # Первая кнопка в строке
-                card1 = cards_in_category[i]
-                row.append(InlineKeyboardButton(
-                    get_short_name(card1), 
-                    callback_data=f"meaning_{card1}_0"
-                ))
-                
-                # Вторая кнопка в строке (если есть)
-                if i+1 < len(cards_in_category):
-                    card2 = cards_in_category[i+1]
-                    row.append(InlineKeyboardButton(
-                        get_short_name(card2),
-                        callback_data=f"meaning_{card2}_0"
-                    ))
-                
-                buttons.append(row)
+            # По две карты в ряд и кнопка "Назад"
+            buttons = [
+                [InlineKeyboardButton(get_short_name(card), callback_data=CARD_CATALOG.callback_for(card))
+                 for card in cards_in_category[i:i + 2]]
+                for i in range(0, len(cards_in_category), 2)
+            ]
+            buttons.append([InlineKeyboardButton("🔙 Назад", callback_data="card_meanings")])
+            
+            SCREENS.register(
+                f"cards:{category_key}",
+                text=f"🃏 *{category_name}* - выберите карту:\n",
+                rows=buttons,
+                parse_mode="Markdown"
+            )
+
+    @staticmethod
+    async def show_cards(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+    
+        # Проверяем загружены ли значения карт
+        if not TarotInterpreter._card_meanings:
+            await query.edit_message_text("🔄 Загружаю значения карт, попробуйте через 2-3 секунды...")
+            await TarotInterpreter.load_meanings()
         
-        # Добавляем кнопку "Назад"
-        buttons.append([InlineKeyboardButton("🔙 Назад", callback_data="card_meanings")])
+        if "cards:major_arcana" not in SCREENS:
+            CardMeaningsHandler.build_card_grids()
+        
+        screen = SCREENS.get(f"cards:{query.data}")
+        
+        if not screen:
+            await query.answer("Категория не найдена")
+            return
         
         try:
             await query.edit_message_text(
-                text=f"🃏 *{category_name}* - выберите карту:\n",
-                reply_markup=InlineKeyboardMarkup(buttons),
-                parse_mode="Markdown"
+                text=screen.text,
+                reply_markup=screen.reply_markup,
+                parse_mode=screen.parse_mode
             )
         except Exception as e:
             logger.error(f"Error showing cards: {e}")
             await context.bot.send_message(
                 chat_id=query.from_user.id,
-                text=f"🃏 *{category_name}* - выберите карту:",
-                reply_markup=InlineKeyboardMarkup(buttons),
-                parse_mode="Markdown"
+                text=screen.text,
+                reply_markup=screen.reply_markup,
+                parse_mode=screen.parse_mode
             )
 
     @staticmethod
@@ -404,42 +447,21 @@ class CardMeaningsHandler(BaseHandler):
         await query.answer()
         
         try:
-            data = query.data.split("_")
-            card_name = "_".join(data[1:-1])
-            is_reversed = data[-1] == "1"
+            if not CARD_CATALOG.compiled:
+                if not TarotInterpreter._card_meanings:
+                    await TarotInterpreter.load_meanings()
+                CardMeaningsHandler.build_card_grids()
             
-            card_data = TarotInterpreter._card_meanings.get(card_name, {})
-            if not card_data:
+            parsed = CARD_CATALOG.parse_callback(query.data)
+            screen = CARD_CATALOG.screen(*parsed) if parsed else None
+            if not screen:
                 await query.answer("Информация о карте не найдена")
                 return
             
-            # Формируем текст
-            position = "Перевернутое" if is_reversed else "Прямое"
-            text = (
-                f"✨ *{card_name}* ({position} положение)\n"
-                f"🏷️ Категория: {card_data.get('category', '?')}\n\n"
-                f"📖 *Значение:*\n{card_data.get('meaning', 'Нет данных')}\n\n"
-                f"🔮 *{position} положение:*\n"
-                f"{card_data.get('reversed' if is_reversed else 'upright', 'Нет данных')}"
-            )
-            
-            # Создаем кнопки
-            buttons = [
-                [
-                    InlineKeyboardButton(
-                        "🔄 Показать " + ("прямое" if is_reversed else "перевернутое"),
-                        callback_data=f"meaning_{card_name}_{1 if not is_reversed else 0}"
-                    )
-                ],
-                [
-                    InlineKeyboardButton("🏠 На главную", callback_data="start_over")
-                ]
-            ]
-            
             await query.edit_message_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(buttons),
-                parse_mode="Markdown"
+                text=screen.text,
+                reply_markup=screen.reply_markup,
+                parse_mode=screen.parse_mode
             )
         except Exception as e:
             logger.error(f"Error showing card meaning: {e}")
@@ -454,7 +476,7 @@ class CardMeaningsHandler(BaseHandler):
         """Отмена поиска"""
         await update.message.reply_text(
             "Поиск отменен.",
-            reply_markup=BaseHandler.create_keyboard([("🏠 На главную", "start_over")])
+            reply_markup=SCREENS.keyboard("home")
         )
         return ConversationHandler.END
 
@@ -477,30 +499,16 @@ class StartHandler(BaseHandler):
             # Регистрируем/обновляем пользователя ОДИН РАЗ
             await add_user(user.id, user.username, referrer_id, context=context)
     
-            buttons = [
-                ("🃏 Дневной расклад", "daily_reading"),
-                ("🃏 Недельный расклад", "weekly_reading"),
-                ("🃏 Запросить расклад", "request_reading"),
-                ("💎 Подписка", "subscription"),
-                ("📜 Значения карт", "card_meanings"),
-                ("📞 Консультация", "consultation"),
-                ("👫 Пригласить друга", "referral"),
-                ("ℹ️ Помощь", "help")
-            ]
+            screen = SCREENS["start"]
     
             # Отправляем привет в ЛЮБОМ случае (если пришли из callback — тоже шлём новое сообщение)
-            await context.bot.send_photo(
+            await MediaRegistry.send_photo(
+                context.bot,
                 chat_id=user.id,
-                photo=Config.WELCOME_IMAGE_URL,
-                caption=(
-                    f"🌟 {h('Без лишней магии — только ясность!')} \n\n"
-                    "Здесь можно быстро навести порядок в мыслях и получить честный совет — карты не льстят и не пугают, а помогают увидеть суть.\n\n"
-                    f"{sep()}\n"
-                    f"{bullet(['Быстрые расклады', 'Пакеты попыток и подписка', 'Полная база значений карт', 'Личная консультация'])}\n\n"
-                    "Выберите действие ниже:"
-                ),
-                parse_mode=PARSE,
-                reply_markup=BaseHandler.create_keyboard(buttons, columns=2)
+                source=Config.WELCOME_IMAGE_URL,
+                caption=screen.text,
+                parse_mode=screen.parse_mode,
+                reply_markup=screen.reply_markup
             )
         except Exception as e:
             logger.error(f"Start error: {str(e)}", exc_info=True)
@@ -524,28 +532,7 @@ class HelpHandler(BaseHandler):
         query = update.callback_query
         chat_id = update.effective_chat.id
      
-        help_text = (
-        f"{h('Что умеет бот')} \n\n"
-        f"{bullet(['🃏 Расклад — получи честный разбор твоей ситуации',
-                   '💎 Подписка — неограниченный доступ к раскладам, когда захочешь',
-                   '📜 Значения карт — полная база по каждой карте, без лишних слов',
-                   '📞 Консультация — персональный разбор от опытного таролога'])}\n\n"
-        f"{sep()}\n"
-        f"{h('Советы по формулировке вопросов')}\n"
-        f"{bullet(['Спрашивайте конкретно: «Что мне сделать, чтобы ...?»',
-                   'Добавьте детали ситуации — это повышает точность'])}\n\n"
-        f"{kv('Связаться с поддержкой', f'@{Config.ADMIN_USERNAME}')}\n"
-        "Доступен всегда — отвечу по мере возможности."
-    )
-
-     
-        buttons = [
-            ("🃏 Расклад", "request_reading"),
-            ("💎 Подписка", "subscription"),
-            ("📞 Консультация", "consultation"),
-            ("🏠 На главную", "start_over")
-        ]
-        keyboard = BaseHandler.create_keyboard(buttons, columns=2)
+        help_text, keyboard = SCREENS["help"].text, SCREENS["help"].reply_markup
     
         try:
             if query:
@@ -584,7 +571,7 @@ class HelpHandler(BaseHandler):
             await context.bot.send_message(
                 chat_id=chat_id,
                 text="⚠️ Не удалось загрузить справочную информацию. Попробуйте позже.",
-                reply_markup=BaseHandler.create_keyboard([("🏠 На главную", "start_over")])
+                reply_markup=SCREENS.keyboard("home")
             )
 
 class ConsultationHandler(BaseHandler):
@@ -689,7 +676,7 @@ class ConsultationHandler(BaseHandler):
             await update.message.reply_text(
                 "✅ Ваш запрос на консультацию отправлен!\n\n"
                 "Наш таролог свяжется с вами в ближайшее время для уточнения деталей.",
-                reply_markup=BaseHandler.create_keyboard([("🏠 На главную", "start_over")])
+                reply_markup=SCREENS.keyboard("home")
             )
             
             return ConversationHandler.END
@@ -698,7 +685,7 @@ class ConsultationHandler(BaseHandler):
             logger.error(f"Error in consultation: {e}")
             await update.message.reply_text(
                 "⚠️ Произошла ошибка при отправке запроса. Попробуйте позже.",
-                reply_markup=BaseHandler.create_keyboard([("🏠 На главную", "start_over")])
+                reply_markup=SCREENS.keyboard("home")
             )
             return ConversationHandler.END
 
@@ -707,7 +694,7 @@ class ConsultationHandler(BaseHandler):
         """Отмена консультации"""
         await update.message.reply_text(
             "❌ Заказ консультации отменен.",
-            reply_markup=BaseHandler.create_keyboard([("🏠 На главную", "start_over")])
+            reply_markup=SCREENS.keyboard("home")
         )
         return ConversationHandler.END
 
@@ -761,15 +748,13 @@ class SubscriptionHandler(BaseHandler):
     
             # Получаем данные с обработкой возможных ошибок
             try:
-                attempts = await get_attempts(user_id)
-                has_sub = bool(await get_active_subscription(user_id))
+                attempts, has_sub = await get_entitlement(user_id)
                 logger.info(f"User data loaded - attempts: {attempts}, has_sub: {has_sub}")
             except Exception as db_error:
                 logger.error(f"Database error for user {user_id}: {db_error}")
                 raise
     
             # Формируем текст сообщения
-            has_sub = bool(await get_active_subscription(user_id))
             attempts_display = "∞" if has_sub else (attempts if attempts is not None else 0)
             
             text = (
@@ -783,20 +768,11 @@ class SubscriptionHandler(BaseHandler):
                 "Решай сам — глубоко и по делу или по чуть-чуть, но всегда по фактам."
             )
     
-            # Создаем кнопки
-            buttons = [
-                ("💎 Месячная (349₽)", "sub_monthly"),
-                ("🛒 5 попыток (99₽)", "sub_5"),
-                ("🛒 10 попыток (149₽)", "sub_10"),
-                ("🛒 15 попыток (229₽)", "sub_15"),
-                ("🔙 На главную", "start_over")
-            ]
-    
             # Пытаемся обновить сообщение
             try:
                 await query.edit_message_text(
                     text=text,
-                    reply_markup=BaseHandler.create_keyboard(buttons, columns=2),
+                    reply_markup=SCREENS.keyboard("subscriptions"),
                     parse_mode=PARSE
                 )
                 logger.info(f"Successfully updated menu for user {user_id}")
@@ -805,7 +781,7 @@ class SubscriptionHandler(BaseHandler):
                 await context.bot.send_message(
                     chat_id=user_id,
                     text=text,
-                    reply_markup=BaseHandler.create_keyboard(buttons, columns=2),
+                    reply_markup=SCREENS.keyboard("subscriptions"),
                     parse_mode=PARSE
                 )
     
@@ -878,42 +854,138 @@ class SubscriptionHandler(BaseHandler):
 class ReadingHandler(BaseHandler):
     """Обработчики раскладов Таро"""
     
+    @staticmethod
+    async def start_interpretation(context: ContextTypes.DEFAULT_TYPE, user_id: int,
+                                   question: str, situation: str, cards: list,
+                                   render, reply_markup=None, interpretation=None, quick=False):
+        """Списывает попытку и ставит интерпретацию в фоновую очередь (или сразу отдаёт готовую).
+
+        quick — быстрый расклад по шаблону: сразу и без списания попытки. Он же
+        выдаётся вместо GigaChat, когда тот недоступен или очередь переполнена.
+        """
+        if not InterpretationQueue.reserve(user_id):
+            await context.bot.send_message(
+                chat_id=user_id,
+                text="⏳ Ваш предыдущий расклад ещё готовится, подождите немного."
+            )
+            return
+
+        await TemplateInterpreter.ensure_compiled()
+        reason = None
+        if not interpretation and not quick:
+            if not TarotInterpreter.available():
+                # GigaChat недоступен — отвечаем из кэша (попытка списывается, как за любой
+                # готовый ответ ниже) или по шаблону (бесплатно, как быстрый расклад)
+                interpretation = await InterpretationCache.get(question, situation, cards)
+                if not interpretation:
+                    if not TemplateInterpreter.can_interpret(cards):
+                        InterpretationQueue.release(user_id)
+                        await context.bot.send_message(chat_id=user_id, text=f"⚠️ {ERROR_UNAVAILABLE}.")
+                        return
+                    reason = REASON_UNAVAILABLE
+            elif InterpretationQueue.overloaded() and TemplateInterpreter.can_interpret(cards):
+                reason = REASON_BUSY
+
+        if quick or reason:
+            try:
+                text = TemplateInterpreter.interpret(question, situation, cards)
+                if not text:
+                    raise ValueError("No card meanings for quick reading")
+                if reason:
+                    text += FALLBACK_NOTE.format(reason=reason)
+                await ReadingHandler._send_reading(context, user_id, question, situation, cards,
+                                                   render, reply_markup, text)
+            except Exception as e:
+                logger.error(f"Error sending quick reading: {e}", exc_info=True)
+                await context.bot.send_message(
+                    chat_id=user_id,
+                    text="❌ Произошла ошибка при генерации интерпретации. Попробуйте позже."
+                )
+            finally:
+                InterpretationQueue.release(user_id)
+            return
+
+        consumed = False
+        try:
+            # Проверка доступа и списание попытки одной транзакцией
+            charge = await consume_attempt(user_id)
+            if charge is None:
+                InterpretationQueue.release(user_id)
+                await context.bot.send_message(
+                    chat_id=user_id,
+                    text=SCREENS["no_attempts"].text,
+                    reply_markup=SCREENS["no_attempts"].reply_markup
+                )
+                return
+            # Подписчику без попыток ничего не списано — и возвращать при ошибке нечего
+            consumed = charge[1]
+
+            if interpretation:
+                # Готовый текст (заготовка на период или кэш) — отвечаем сразу, без очереди и GigaChat
+                await ReadingHandler._send_reading(context, user_id, question, situation, cards,
+                                                   render, reply_markup, interpretation)
+                InterpretationQueue.release(user_id)
+                return
+
+            placeholder = await context.bot.send_message(chat_id=user_id, text=PLACEHOLDER_TEXT)
+            InterpretationQueue.submit(InterpretationJob(
+                user_id=user_id,
+                chat_id=user_id,
+                message_id=placeholder.message_id,
+                question=question,
+                situation=situation,
+                cards=cards,
+                render=render,
+                reply_markup=reply_markup,
+                charged=consumed
+            ))
+        except Exception as e:
+            logger.error(f"Error queueing interpretation: {e}", exc_info=True)
+            InterpretationQueue.release(user_id)
+            if consumed:
+                await update_attempts(user_id, 1)  # возвращаем списанную попытку
+            await context.bot.send_message(
+                chat_id=user_id,
+                text="❌ Произошла ошибка при генерации интерпретации. Попробуйте позже."
+            )
+
+    @staticmethod
+    async def _send_reading(context: ContextTypes.DEFAULT_TYPE, user_id: int,
+                            question: str, situation: str, cards: list,
+                            render, reply_markup, interpretation: str):
+        """Сохраняет готовый расклад и отправляет его (без Markdown, если текст ломает разметку)"""
+        await save_reading(user_id, question, situation, cards, interpretation)
+        try:
+            await context.bot.send_message(
+                chat_id=user_id,
+                text=render(interpretation),
+                reply_markup=reply_markup,
+                parse_mode="Markdown"
+            )
+        except BadRequest as e:
+            if "parse" not in str(e).lower():
+                raise
+            await context.bot.send_message(
+                chat_id=user_id,
+                text=render(interpretation),
+                reply_markup=reply_markup
+            )
+
     @staticmethod
     async def daily_reading(update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
         user_id = query.from_user.id
     
-        # Проверка доступа
-        if not await BaseHandler.check_access(user_id):
-            await context.bot.send_message(
-                chat_id=user_id,
-                text="❌ У вас закончились бесплатные попытки.\n"
-                     "Приобретите подписку или попытки.",
-                reply_markup=BaseHandler.create_keyboard([
-                    ("💎 Подписка", "subscription"),
-                    ("🔙 На главную", "start_over")
-                ])
-            )
-            return ConversationHandler.END
-    
-        # Списываем попытку
-        await update_attempts(user_id, -1)
-    
         # Берем одну случайную карту
         card = random.choice(TAROT_DECK)
         
-        # Генерируем интерпретацию для одной карты
-        reading = await TarotInterpreter.generate_interpretation(
-            "Что меня ждет сегодня?", 
-            "", 
-            [card]
-        )
-        
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=f"✨ Ваш дневной расклад:\n\nКарта дня: *{card}*\n\n{reading}",
-            parse_mode="Markdown"
+        # Готовая заготовка на сегодня, иначе интерпретация придёт из фоновой очереди
+        await ReadingHandler.start_interpretation(
+            context, user_id,
+            DAILY_QUESTION, "", [card],
+            render=lambda reading: f"✨ Ваш дневной расклад:\n\nКарта дня: *{card}*\n\n{reading}",
+            interpretation=await ReadingPregenerator.lookup("daily", card)
         )
         return ConversationHandler.END
     
@@ -923,62 +995,42 @@ class ReadingHandler(BaseHandler):
         await query.answer()
         user_id = query.from_user.id
     
-        # Проверка доступа
-        if not await BaseHandler.check_access(user_id):
-            await context.bot.send_message(
-                chat_id=user_id,
-                text="❌ У вас закончились бесплатные попытки.\n"
-                     "Приобретите подписку или попытки.",
-                reply_markup=BaseHandler.create_keyboard([
-                    ("💎 Подписка", "subscription"),
-                    ("🔙 На главную", "start_over")
-                ])
-            )
-            return ConversationHandler.END
-    
-        # Списываем попытку
-        await update_attempts(user_id, -1)
-    
         # Берем одну случайную карту
         card = random.choice(TAROT_DECK)
         
-        # Генерируем интерпретацию для одной карты
-        reading = await TarotInterpreter.generate_interpretation(
-            "Что меня ждет на этой неделе?", 
-            "", 
-            [card]
-        )
-        
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=f"✨ Ваш недельный расклад:\n\nКарта недели: *{card}*\n\n{reading}",
-            parse_mode="Markdown"
+        # Готовая заготовка на эту неделю, иначе интерпретация придёт из фоновой очереди
+        await ReadingHandler.start_interpretation(
+            context, user_id,
+            WEEKLY_QUESTION, "", [card],
+            render=lambda reading: f"✨ Ваш недельный расклад:\n\nКарта недели: *{card}*\n\n{reading}",
+            interpretation=await ReadingPregenerator.lookup("weekly", card)
         )
         return ConversationHandler.END
 
     @staticmethod
     async def begin_reading(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Начало процесса расклада"""
+        """Начало процесса расклада (обычного или быстрого по шаблону)"""
         query = update.callback_query
         await query.answer()
-    
-        if not await BaseHandler.check_access(query.from_user.id):
+
+        # "back" возвращает к вопросу в том же режиме
+        quick = query.data == "quick_reading" or (query.data == "back" and context.user_data.get("quick", False))
+        # Быстрый расклад бесплатный — попытки нужны только для GigaChat
+        if not quick and not await BaseHandler.check_access(query.from_user.id):
             await context.bot.send_message(
                 chat_id=query.from_user.id,
-                text="❌ У вас закончились бесплатные попытки.\n"
-                     "Приобретите подписку или попытки.",
-                reply_markup=BaseHandler.create_keyboard([
-                    ("💎 Подписка", "subscription"),
-                    ("🔙 На главную", "start_over")
-                ])
+                text=SCREENS["no_attempts"].text,
+                reply_markup=SCREENS["no_attempts"].reply_markup
             )
             return ConversationHandler.END
     
         context.user_data.clear()
+        context.user_data["quick"] = quick
         
         await context.bot.send_message(
             chat_id=query.from_user.id,
-            text="🔮 *Сформулируй свой вопрос — чётко и по делу*\n\n"
+            text=("⚡ *Быстрый расклад* — мгновенно, по значениям карт, без списания попыток.\n\n" if quick else "") +
+                 "🔮 *Сформулируй свой вопрос — чётко и по делу*\n\n"
                  "Пример: «Какие реальные шаги помогут мне улучшить отношения?»\n"
                  "Чем конкретнее вопрос, тем полезнее ответ.\n\n",
             parse_mode="Markdown"
@@ -1099,9 +1151,10 @@ class ReadingHandler(BaseHandler):
             [InlineKeyboardButton(f"🃏 {i+1}", callback_data=f"pick_card_{i}")]
             for i in range(6)
         ]
-        await context.bot.send_photo(
+        await MediaRegistry.send_photo(
+            context.bot,
             chat_id=query.from_user.id,
-            photo=CARDS_IMAGE,
+            source=CARDS_IMAGE,
             caption=f"Выберите карту №1 из {num_cards}",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
@@ -1175,7 +1228,7 @@ class ReadingHandler(BaseHandler):
 
     @staticmethod
     async def finish_reading(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Завершение расклада и показ результата"""
+        """Завершение расклада: интерпретация готовится в фоне"""
         user_id = update.effective_user.id
         question = context.user_data.get("question", "")
         situation = context.user_data.get("situation", "")
@@ -1188,59 +1241,28 @@ class ReadingHandler(BaseHandler):
                 text="❌ Произошла ошибка при обработке карт"
             )
             return ConversationHandler.END
-        
-        try:
-            processing_msg = await context.bot.send_message(
-                chat_id=user_id,
-                text="🔮 Интерпретирую карты..."
-            )
-            
-            interpretation = await asyncio.wait_for(
-                TarotInterpreter.generate_interpretation(question, situation, cards),
-                timeout=30
-            )
-            
-            if not interpretation:
-                raise ValueError("Empty interpretation received")
-            
-            await save_reading(user_id, question, situation, cards, interpretation)
-            await update_attempts(user_id, -1)
-            
-            result = (
+
+        def render(interpretation: str) -> str:
+            return (
                 f"✨ *Ваш расклад*\n\n"
                 f"❓ Вопрос: {question}\n"
                 f"🃏 Карты: {', '.join(cards)}\n\n"
                 f"📖 *Интерпретация:*\n{interpretation}\n\n"
                 f"💎 Хотите более подробный разбор? Закажите консультацию!"
             )
-            
-            buttons = [
-                ("📞 Консультация", "consultation"),
-                ("🔄 Новый расклад", "request_reading"),
-                ("🏠 На главную", "start_over")
-            ]
-            
-            await processing_msg.delete()
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=result,
-                reply_markup=BaseHandler.create_keyboard(buttons),
-                parse_mode="Markdown"
-            )
-            
-        except asyncio.TimeoutError:
-            logger.error("Timeout generating interpretation")
-            await context.bot.send_message(
-                chat_id=user_id,
-                text="⏳ Время генерации истекло. Попробуйте позже."
-            )
-        except Exception as e:
-            logger.error(f"Error in finish_reading: {str(e)}")
-            await context.bot.send_message(
-                chat_id=user_id,
-                text="❌ Произошла ошибка при генерации интерпретации. Попробуйте позже."
-            )
-        
+
+        buttons = [
+            ("📞 Консультация", "consultation"),
+            ("🔄 Новый расклад", "request_reading"),
+            ("🏠 На главную", "start_over")
+        ]
+
+        await ReadingHandler.start_interpretation(
+            context, user_id, question, situation, cards,
+            render=render,
+            reply_markup=BaseHandler.create_keyboard(buttons),
+            quick=context.user_data.get("quick", False)
+        )
         return ConversationHandler.END
 
     @staticmethod
@@ -1249,7 +1271,7 @@ class ReadingHandler(BaseHandler):
         context.user_data.clear()
         await update.message.reply_text(
             "❌ Расклад отменен.",
-            reply_markup=BaseHandler.create_keyboard([("🏠 На главную", "start_over")])
+            reply_markup=SCREENS.keyboard("home")
         )
         return ConversationHandler.END
 
@@ -1356,13 +1378,7 @@ class AdminHandler(BaseHandler):
             admin_id = -1
             uid = int(update.effective_user.id)
 
-        buttons = [
-            ("👤 Управление пользователями", "admin_users"),
-            ("📊 Аналитика", "admin_analytics"),
-            ("📢 Рассылка", "admin_broadcast"),
-            ("🔙 На главную", "start_over")
-        ]
-        kb = BaseHandler.create_keyboard(buttons)
+        kb = SCREENS.keyboard("admin")
 
         # Если не админ — отвечаем корректно и выходим
         if uid != admin_id:
@@ -1374,18 +1390,39 @@ class AdminHandler(BaseHandler):
 
         # Рендерим меню
         if getattr(update, "message", None):
-            await update.message.reply_text("⚙️ *Админ-панель*", reply_markup=kb, parse_mode="Markdown")
+            await update.message.reply_text(SCREENS["admin"].text, reply_markup=kb, parse_mode=SCREENS["admin"].parse_mode)
         elif getattr(update, "callback_query", None):
             q = update.callback_query
             await q.answer()
             # если исходное сообщение нельзя отредактировать — шлём новое
             try:
-                await q.edit_message_text("⚙️ *Админ-панель*", reply_markup=kb, parse_mode="Markdown")
+                await q.edit_message_text(SCREENS["admin"].text, reply_markup=kb, parse_mode=SCREENS["admin"].parse_mode)
             except BadRequest:
-                await context.bot.send_message(chat_id=uid, text="⚙️ *Админ-панель*", reply_markup=kb, parse_mode="Markdown")
+                await context.bot.send_message(chat_id=uid, text=SCREENS["admin"].text, reply_markup=kb, parse_mode=SCREENS["admin"].parse_mode)
         else:
             logger.warning("admin_menu: неизвестный тип апдейта")
 
+    @staticmethod
+    async def toggle_profiling(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/profile [секунды] — включает захват профиля, повторная команда останавливает досрочно"""
+        if str(update.effective_user.id) != str(Config.ADMIN_CHAT_ID):
+            await update.message.reply_text("❌ Доступ запрещён")
+            return
+        if Profiler.running():
+            Profiler.stop()
+            await update.message.reply_text("⏹ Профилирование остановлено, отчёт сейчас придёт")
+            return
+        try:
+            seconds = int(context.args[0]) if context.args else Config.PROFILE_SECONDS
+        except ValueError:
+            await update.message.reply_text("Использование: /profile [секунды]")
+            return
+        seconds = Profiler.start(context.bot, update.effective_chat.id, seconds)
+        text = f"🧪 Профилирование на {seconds} с. Отчёт придёт документом, /profile — остановить раньше"
+        if Profiler.engine() == "cProfile":
+            text += f"\n\n{CPROFILE_NOTE}"
+        await update.message.reply_text(text)
+
     @staticmethod
     async def admin_menu_exit(update, context):
         """Показывает админ-меню и ЗАВЕРШАЕТ текущий Conversation."""
@@ -1405,44 +1442,18 @@ class AdminHandler(BaseHandler):
 
     @staticmethod
     async def process_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        import asyncio
-        from telegram.error import RetryAfter
-    
+        """Запуск фоновой рассылки; прогресс обновляется в отдельном сообщении"""
         text = update.message.text or (update.message.caption if update.message.caption else "")
         photo = update.message.photo[-1].file_id if update.message.photo else None
-        users = await execute_query("SELECT telegram_id FROM users")
-        errors = 0
-        sent = 0
-    
-        for idx, (user_id,) in enumerate(users):
-            try:
-                if photo:
-                    await context.bot.send_photo(
-                        chat_id=user_id,
-                        photo=photo,
-                        caption=text if text else None
-                    )
-                else:
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=text
-                    )
-                sent += 1
-            except RetryAfter as e:
-                logger.warning(f"FloodWait: сплю {e.retry_after} секунд...")
-                await asyncio.sleep(e.retry_after)
-                continue
-            except Exception as e:
-                errors += 1
-                logger.error(f"Не удалось отправить сообщение {user_id}: {e}")
-            await asyncio.sleep(1.2)  # Задержка между отправкой
-    
-        await update.message.reply_text(
-            f"✅ Рассылка завершена!\n\n"
-            f"Успешно: {sent}\n"
-            f"Ошибок: {errors}",
-            reply_markup=BaseHandler.create_keyboard([("🔙 В меню", "start_over")])
-        )
+
+        try:
+            await BroadcastEngine.launch(context.bot, text, photo, update.effective_chat.id)
+        except Exception as e:
+            logger.error(f"Error starting broadcast: {e}", exc_info=True)
+            await update.message.reply_text(
+                "❌ Не удалось запустить рассылку",
+                reply_markup=BaseHandler.create_keyboard([("🔙 В меню", "start_over")])
+            )
         return ConversationHandler.END
 
     @staticmethod
@@ -1451,20 +1462,12 @@ class AdminHandler(BaseHandler):
         query = update.callback_query
         await query.answer()
         
-        buttons = [
-            ("➕ Добавить попытки", "admin_add_attempts"),
-            ("➖ Удалить попытки", "admin_remove_attempts"),
-            ("💎 Добавить подписку", "admin_add_sub"),
-            ("🚫 Аннулировать подписку", "admin_cancel_sub"),
-            ("📋 Список пользователей", "admin_list_users"),
-            ("✉️ Написать пользователю", "admin_send_msg"),
-            ("🔙 Назад", "start_over")
-        ]
+        screen = SCREENS["admin_users"]
         
         await query.edit_message_text(
-            "👥 *Управление пользователями*",
-            reply_markup=BaseHandler.create_keyboard(buttons, columns=2),
-            parse_mode="Markdown"
+            screen.text,
+            reply_markup=screen.reply_markup,
+            parse_mode=screen.parse_mode
         )
 
     @staticmethod
@@ -1571,47 +1574,78 @@ class AdminHandler(BaseHandler):
         )
         return ConversationHandler.END
 
+    USERS_PAGE_SIZE = 10
+    USERNAME_PREFIX_RE = re.compile(r"^@?(\w{1,32})$", re.ASCII)
+
+    @staticmethod
+    async def _check_admin(update: Update) -> bool:
+        """Пропускает только администратора; остальным — «Доступ запрещён».
+
+        Нужна в каждом обработчике с данными пользователей: callback data
+        (au:/aud:) можно подделать и без входа через /admin.
+        """
+        try:
+            if int(update.effective_user.id) == int(Config.ADMIN_CHAT_ID):
+                return True
+        except (TypeError, ValueError):
+            logger.error("ADMIN_CHAT_ID в Config задан неверно (ожидается int)")
+        if getattr(update, "callback_query", None):
+            await update.callback_query.answer("❌ Доступ запрещён", show_alert=True)
+        elif getattr(update, "message", None):
+            await update.message.reply_text("❌ Доступ запрещён")
+        return False
+
+    @staticmethod
+    async def _users_page(cursor_id: Optional[int] = None, backward: bool = False,
+                          prefix: Optional[str] = None) -> Screen:
+        """Страница списка пользователей: кнопка на каждого и навигация по курсору"""
+        rows, has_more = await get_users_page(cursor_id, backward, AdminHandler.USERS_PAGE_SIZE, prefix)
+        title = f"🔍 Username на «{prefix}»" if prefix else "👥 Пользователи"
+        if not rows:
+            text = f"{title}\n\n📂 Никого не найдено" if prefix else "📂 База данных пользователей пуста"
+            return Screen(text, BaseHandler.create_keyboard([("🔙 Назад", "admin_users")]))
+
+        text = f"{title} (от новых к старым):\n\n"
+        keyboard = []
+        for user_id, username, created_at, attempts, has_sub in rows:
+            username_display = f"@{username}" if username else "нет username"
+            text += (
+                f"🆔 {user_id} | 👤 {username_display}\n"
+                f"🃏 Попыток: {attempts} | Подписка: {'✅' if has_sub else '❌'} | 📅 {str(created_at)[:10]}\n"
+            )
+            keyboard.append([InlineKeyboardButton(
+                f"{user_id} · {username_display}",
+                callback_data=pack("aud", user_id)
+            )])
+
+        # Назад есть, если пришли с курсором вперёд или сзади остались строки; вперёд — наоборот
+        has_prev = has_more if backward else cursor_id is not None
+        has_next = cursor_id is not None if backward else has_more
+        extra = (prefix,) if prefix else ()
+        nav = []
+        if has_prev:
+            nav.append(InlineKeyboardButton("◀️", callback_data=pack("au", "p", rows[0][0], *extra)))
+        if has_next:
+            nav.append(InlineKeyboardButton("▶️", callback_data=pack("au", "n", rows[-1][0], *extra)))
+        if nav:
+            keyboard.append(nav)
+        keyboard.append([
+            InlineKeyboardButton("🔍 Поиск", callback_data="admin_user_search"),
+            InlineKeyboardButton("🔙 Назад", callback_data="admin_users")
+        ])
+        return Screen(text, InlineKeyboardMarkup(keyboard))
+
     @staticmethod
     async def admin_list_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Список пользователей с актуальными данными о попытках"""
+        """Первая страница списка пользователей"""
+        if not await AdminHandler._check_admin(update):
+            return
         query = update.callback_query
         await query.answer()
         
         try:
-            users = await execute_query("""
-                SELECT 
-                    u.telegram_id, 
-                    u.username, 
-                    COALESCE(a.remaining, 0) as attempts,
-                    MAX(s.end_date) as sub_end
-                FROM users u
-                LEFT JOIN attempts a ON u.telegram_id = a.user_id
-                LEFT JOIN subscriptions s ON u.telegram_id = s.user_id AND s.end_date > datetime('now')
-                GROUP BY u.telegram_id
-                ORDER BY u.created_at DESC
-                LIMIT 50
-            """)
-            
-            if not users:
-                text = "📂 База данных пользователей пуста"
-            else:
-                text = "👥 Последние 50 пользователей:\n\n"
-                for user in users:
-                    user_id, username, attempts, sub_end = user
-                    sub_status = "✅" if sub_end else "❌"
-                    username_display = f"@{username}" if username else "нет username"
-                    
-                    text += (
-                        f"🆔 {user_id} | 👤 {username_display}\n"
-                        f"🃏 Попыток: {attempts} | Подписка: {sub_status}\n"
-                        f"————————————————\n"
-                    )
-            
-            await query.edit_message_text(
-                text=text,
-                reply_markup=BaseHandler.create_keyboard([("🔙 Назад", "admin_users")]),
-                parse_mode=None
-            )
+            screen = await AdminHandler._users_page()
+            await query.edit_message_text(text=screen.text, reply_markup=screen.reply_markup)
         except Exception as e:
             logger.error(f"Error in admin_list_users: {e}")
             await query.edit_message_text(
@@ -1619,6 +1653,99 @@ class AdminHandler(BaseHandler):
                 reply_markup=BaseHandler.create_keyboard([("🔙 Назад", "admin_users")])
             )
 
+    @staticmethod
+    async def admin_users_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Листание списка: au:<n|p>:<граничный id>[:<префикс username>]"""
+        if not await AdminHandler._check_admin(update):
+            return
+        query = update.callback_query
+        await query.answer()
+
+        _, args = unpack(query.data)
+        if len(args) not in (2, 3) or args[0] not in ("n", "p") or not args[1].isdigit():
+            return
+        prefix = args[2] if len(args) == 3 else None
+        try:
+            screen = await AdminHandler._users_page(int(args[1]), args[0] == "p", prefix)
+            await query.edit_message_text(text=screen.text, reply_markup=screen.reply_markup)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                logger.error(f"Error in admin_users_page: {e}")
+        except Exception as e:
+            logger.error(f"Error in admin_users_page: {e}")
+
+    @staticmethod
+    async def admin_user_detail(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Карточка пользователя: aud:<id>"""
+        if not await AdminHandler._check_admin(update):
+            return
+        query = update.callback_query
+        await query.answer()
+
+        _, args = unpack(query.data)
+        if len(args) != 1 or not args[0].isdigit():
+            return
+        keyboard = BaseHandler.create_keyboard([
+            ("📋 К списку", "admin_list_users"),
+            ("🔙 В меню", "admin_users")
+        ])
+        try:
+            user = await get_user_details(int(args[0]))
+            if not user:
+                await query.edit_message_text("❌ Пользователь не найден", reply_markup=keyboard)
+                return
+
+            username_display = f"@{user['username']}" if user["username"] else "нет username"
+            sub = f"✅ до {str(user['sub_end'])[:16]}" if user["sub_end"] else "❌ нет"
+            text = (
+                f"👤 Пользователь {user['telegram_id']}\n\n"
+                f"Username: {username_display}\n"
+                f"📅 Регистрация: {str(user['created_at'])[:16]}\n"
+                f"🃏 Попыток: {user['attempts']}\n"
+                f"💎 Подписка: {sub}\n"
+                f"🔮 Раскладов: {user['readings']}"
+                + (f" (последний {str(user['last_reading'])[:16]})" if user["last_reading"] else "")
+                + "\n"
+                f"🤝 Пригласил: {user['referrer_id'] or '—'}"
+            )
+            await query.edit_message_text(text=text, reply_markup=keyboard)
+        except Exception as e:
+            logger.error(f"Error in admin_user_detail: {e}")
+            await query.edit_message_text("❌ Ошибка при получении данных пользователя", reply_markup=keyboard)
+
+    @staticmethod
+    async def admin_user_search_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Запрос начала username для поиска"""
+        if not await AdminHandler._check_admin(update):
+            return ConversationHandler.END
+        query = update.callback_query
+        await query.answer()
+        await query.edit_message_text(
+            "🔍 Введите начало username (латиница, цифры, _):",
+            reply_markup=BaseHandler.create_keyboard([("🔙 Назад", "admin_users")])
+        )
+        return "ADMIN_USER_SEARCH"
+
+    @staticmethod
+    async def admin_user_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Поиск пользователей по префиксу username"""
+        if not await AdminHandler._check_admin(update):
+            return ConversationHandler.END
+        match = AdminHandler.USERNAME_PREFIX_RE.match(update.message.text.strip())
+        if not match:
+            await update.message.reply_text("❌ Username может содержать только латиницу, цифры и _. Попробуйте ещё раз:")
+            return "ADMIN_USER_SEARCH"
+        try:
+            screen = await AdminHandler._users_page(prefix=match.group(1))
+            await update.message.reply_text(text=screen.text, reply_markup=screen.reply_markup)
+        except Exception as e:
+            logger.error(f"Error in admin_user_search: {e}")
+            await update.message.reply_text(
+                "❌ Ошибка при поиске пользователей",
+                reply_markup=BaseHandler.create_keyboard([("🔙 Назад", "admin_users")])
+            )
+        return ConversationHandler.END
+
     @staticmethod
     async def forward_to_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Пересылка вопроса администратору"""
@@ -1648,57 +1775,54 @@ class AdminHandler(BaseHandler):
             
         await update.message.reply_text(
             "✅ Ваш вопрос отправлен! Администратор ответит в ближайшее время.",
-            reply_markup=BaseHandler.create_keyboard([("🏠 На главную", "start_over")])
+            reply_markup=SCREENS.keyboard("home")
         )
         return ConversationHandler.END
 
     @staticmethod
     async def admin_analytics(update, context):
         """Аналитика для администратора"""
+        if not await AdminHandler._check_admin(update):
+            return
         query = getattr(update, "callback_query", None)
         if query:
             await query.answer()
         try:
-            # Собираем статистику
-            stats = await execute_query("""
-                SELECT
-                    (SELECT COUNT(*) FROM users),                               -- всего пользователей
-                    (SELECT COUNT(*) FROM readings),                            -- всего раскладов
-                    (SELECT COUNT(*) FROM subscriptions WHERE end_date > datetime('now')),  -- активные подписки
-                    (SELECT SUM(remaining) FROM attempts),                      -- всего оставшихся попыток
-                    (SELECT COUNT(*) FROM readings WHERE created_at >= datetime('now', '-1 day')),   -- раскладов за сутки
-                    (SELECT COUNT(*) FROM readings WHERE created_at >= datetime('now', '-7 day'))    -- за неделю
-            """)
-            (
-                total_users,
-                total_readings,
-                active_subs,
-                total_attempts,
-                readings_day,
-                readings_week
-            ) = stats[0]
+            # Итоги — из сводки daily_stats, окна за сутки/неделю — по индексу created_at
+            stats = await get_dashboard_stats()
+    
+            queue = InterpretationQueue.stats()
+            coalescing = TarotInterpreter.coalescing_stats()
     
             # Формируем сообщение
             text = (
                 "📊 <b>Аналитика бота</b>\n\n"
-                f"👥 Пользователей: <b>{total_users}</b>\n"
-                f"🃏 Всего раскладов: <b>{total_readings}</b>\n"
-                f"📅 За 24ч: <b>{readings_day}</b>\n"
-                f"📆 За неделю: <b>{readings_week}</b>\n"
-                f"💎 Активных подписок: <b>{active_subs}</b>\n"
-                f"🧮 Оставшихся попыток: <b>{total_attempts}</b>\n"
+                f"👥 Пользователей: <b>{stats['total_users']}</b>\n"
+                f"🃏 Всего раскладов: <b>{stats['total_readings']}</b>\n"
+                f"📅 За 24ч: <b>{stats['readings_day']}</b>\n"
+                f"📆 За неделю: <b>{stats['readings_week']}</b>\n"
+                f"💎 Активных подписок: <b>{stats['active_subs']}</b>\n"
+                f"🧮 Оставшихся попыток: <b>{stats['total_attempts']}</b>\n\n"
+                f"🔮 Очередь интерпретаций: <b>{queue['depth']}</b> (в работе: {queue['running']})\n"
+                f"⏱ Ожидание в очереди: <b>{queue['avg_wait']:.1f} с</b> (макс. {queue['max_wait']:.1f} с)\n"
+                f"🔗 Объединено запросов к GigaChat: <b>{coalescing['hits']}</b> "
+                f"из {coalescing['hits'] + coalescing['misses']} (сейчас в полёте: {coalescing['inflight']})\n"
             )
+            keyboard = BaseHandler.create_keyboard([
+                ("📈 За 30 дней", "admin_stats_30d"),
+                ("🔙 Назад", "start_over")
+            ])
             if query:
                 await query.edit_message_text(
                     text=text,
                     parse_mode="HTML",
-                    reply_markup=BaseHandler.create_keyboard([("🔙 Назад", "start_over")])
+                    reply_markup=keyboard
                 )
             else:
                 await update.message.reply_text(
                     text,
                     parse_mode="HTML",
-                    reply_markup=BaseHandler.create_keyboard([("🔙 Назад", "start_over")])
+                    reply_markup=keyboard
                 )
         except Exception as e:
             logger.error(f"Error in admin_analytics: {e}")
@@ -1714,6 +1838,35 @@ class AdminHandler(BaseHandler):
                     reply_markup=BaseHandler.create_keyboard([("🔙 Назад", "start_over")])
                 )
 
+    @staticmethod
+    async def admin_stats_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Динамика за 30 дней из сводки daily_stats"""
+        if not await AdminHandler._check_admin(update):
+            return
+        query = update.callback_query
+        await query.answer()
+        keyboard = BaseHandler.create_keyboard([("🔙 К аналитике", "admin_analytics")])
+        try:
+            rows = {day: (users, readings, subs) for day, users, readings, subs in await get_daily_stats(30)}
+            today = datetime.now(timezone.utc).date()
+            days = [(today - timedelta(days=i)).isoformat() for i in range(29, -1, -1)]
+            peak = max((rows.get(day, (0, 0, 0))[1] for day in days), default=0) or 1
+
+            lines = ["Дата   Нов  Расклады       Подп"]
+            for day in days:
+                users, readings, subs = rows.get(day, (0, 0, 0))
+                bar = "█" * round(10 * readings / peak)
+                lines.append(f"{day[5:]} {users:>4} {readings:>4} {bar:<10} {subs:>3}")
+
+            text = (
+                "📈 <b>Динамика за 30 дней</b> (UTC)\n\n"
+                f"<pre>{html.escape(chr(10).join(lines))}</pre>"
+            )
+            await query.edit_message_text(text=text, parse_mode="HTML", reply_markup=keyboard)
+        except Exception as e:
+            logger.error(f"Error in admin_stats_history: {e}")
+            await query.edit_message_text("❌ Ошибка при получении аналитики", reply_markup=keyboard)
+
     @staticmethod
     async def admin_send_message_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Пункт меню: отправить сообщение пользователю"""
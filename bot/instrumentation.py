@@ -0,0 +1,82 @@
+import functools
+import logging
+import time
+from typing import Any, Callable
+
+from telegram.error import TimedOut
+from telegram.ext import Application, BaseHandler, ConversationHandler
+from telegram.request import HTTPXRequest
+
+from bot.router import CallbackRouter
+from metrics import HANDLER_SECONDS, HANDLER_ERRORS, TELEGRAM_API_SECONDS
+from tracing import start_trace, finish_trace, record_span
+
+logger = logging.getLogger(__name__)
+
+
+def instrument(callback: Callable) -> Callable:
+    """Обёртка обработчика: время и исключения в метрики с меткой handler (имя функции).
+
+    Заодно открывает трассу апдейта: спаны БД, GigaChat и Bot API внутри
+    обработчика попадают в неё, а медленный апдейт логируется с разбивкой.
+    """
+    if getattr(callback, "__instrumented__", False):
+        return callback
+    name = getattr(callback, "__qualname__", repr(callback))
+
+    @functools.wraps(callback)
+    async def wrapper(update: object, context: Any):
+        trace, token = start_trace(name, getattr(update, "update_id", None))
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            HANDLER_SECONDS.observe(elapsed, handler=name)
+            finish_trace(trace, token, elapsed)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def _wrap_handler(handler: BaseHandler, wrap: Callable[[Callable], Callable]):
+    if isinstance(handler, ConversationHandler):
+        for inner in handler.entry_points + handler.fallbacks:
+            _wrap_handler(inner, wrap)
+        for handlers in handler.states.values():
+            for inner in handlers:
+                _wrap_handler(inner, wrap)
+    elif isinstance(handler, CallbackRouter):
+        handler.wrap_routes(wrap)
+    else:
+        handler.callback = wrap(handler.callback)
+
+
+def instrument_handlers(application: Application, wrap: Callable[[Callable], Callable] = instrument):
+    """Оборачивает все зарегистрированные обработчики, включая состояния диалогов и маршруты роутера"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _wrap_handler(handler, wrap)
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest с замером каждого вызова Bot API (метод и HTTP-статус; 429 — это RetryAfter)"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        api_method = "file_download" if "/file/bot" in url else url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        status = "error"
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            status = str(code)
+            return code, payload
+        except TimedOut:
+            status = "timeout"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            TELEGRAM_API_SECONDS.observe(elapsed, method=api_method, status=status)
+            record_span("telegram", api_method, elapsed)
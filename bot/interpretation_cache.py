@@ -0,0 +1,100 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from config import Config
+from database import get_cached_interpretation, save_cached_interpretation
+from tarot_interpreter import TarotInterpreter, ERROR_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+
+class InterpretationCache:
+    """Кэш готовых интерпретаций: LRU в памяти поверх таблицы interpretation_cache.
+
+    Ключ — TarotInterpreter.prompt_key, тот же, по которому объединяются
+    одновременные запросы к GigaChat. Записи живут INTERPRETATION_CACHE_TTL
+    секунд; в памяти хранится не больше INTERPRETATION_CACHE_MEMORY записей,
+    в БД — не больше INTERPRETATION_CACHE_SIZE (вытесняются давно не
+    использованные).
+    Попадания не пишут в БД: время использования копится в _touched и
+    уходит одной пачкой при следующем put(), перед вытеснением.
+    """
+
+    _entries: OrderedDict = OrderedDict()
+    _touched: Dict[str, float] = {}
+
+    @staticmethod
+    def is_reusable(question: str, situation: str, cards: List[str], interpretation: str) -> bool:
+        """Можно ли отдать этот ответ другому пользователю.
+
+        Кэшируются только расклады без личной ситуации (карта дня, карта
+        недели и т.п.) и только настоящие ответы модели, а не тексты ошибок.
+        """
+        if situation.strip():
+            return False
+        if not interpretation or not interpretation.strip():
+            return False
+        return interpretation not in ERROR_MESSAGES
+
+    @classmethod
+    def _remember(cls, key: str, interpretation: str, created_at: float):
+        cls._entries[key] = (interpretation, created_at)
+        cls._entries.move_to_end(key)
+        while len(cls._entries) > Config.INTERPRETATION_CACHE_MEMORY:
+            cls._entries.popitem(last=False)
+
+    @classmethod
+    async def get(cls, question: str, situation: str, cards: List[str]) -> Optional[str]:
+        if situation.strip():
+            return None
+        key = TarotInterpreter.prompt_key(question, situation, cards)
+        min_created_at = time.time() - Config.INTERPRETATION_CACHE_TTL
+
+        entry = cls._entries.get(key)
+        if entry is not None:
+            interpretation, created_at = entry
+            if created_at >= min_created_at:
+                cls._entries.move_to_end(key)
+                cls._touched[key] = time.time()
+                return interpretation
+            del cls._entries[key]
+
+        try:
+            row = await get_cached_interpretation(key, min_created_at)
+        except Exception as e:
+            logger.warning(f"Interpretation cache lookup failed: {e}")
+            return None
+        if row is None:
+            return None
+        interpretation, created_at = row
+        cls._remember(key, interpretation, created_at)
+        cls._touched[key] = time.time()
+        return interpretation
+
+    @classmethod
+    async def put(cls, question: str, situation: str, cards: List[str], interpretation: str) -> bool:
+        """Сохраняет ответ, если политика разрешает его переиспользовать"""
+        if not cls.is_reusable(question, situation, cards, interpretation):
+            return False
+        key = TarotInterpreter.prompt_key(question, situation, cards)
+        now = time.time()
+        cls._remember(key, interpretation, now)
+        touched = [(used_at, touched_key) for touched_key, used_at in cls._touched.items()]
+        cls._touched = {}
+        try:
+            await save_cached_interpretation(
+                key, interpretation, now,
+                max_entries=Config.INTERPRETATION_CACHE_SIZE,
+                min_created_at=now - Config.INTERPRETATION_CACHE_TTL,
+                touched=touched
+            )
+        except Exception as e:
+            logger.warning(f"Interpretation cache save failed: {e}")
+        return True
+
+    @classmethod
+    def clear(cls):
+        cls._entries.clear()
+        cls._touched.clear()
@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, List, Optional, Set
+
+import aiohttp
+from telegram import Bot, InlineKeyboardMarkup
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest
+
+from config import Config
+from database import save_reading, update_attempts
+from metrics import INTERPRETATION_QUEUE
+from tracing import start_trace, finish_trace, current_trace
+from tarot_interpreter import TarotInterpreter, GigaChatError, ERROR_MESSAGES
+from bot.interpretation_cache import InterpretationCache
+from bot.template_interpreter import TemplateInterpreter, FALLBACK_NOTE, REASON_TIMEOUT, REASON_UNAVAILABLE
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_TEXT = "🔮 Интерпретирую карты..."
+
+
+def split_message(text: str, limit: int = MessageLimit.MAX_TEXT_LENGTH) -> List[str]:
+    """Режет текст на части не длиннее limit — по абзацам, строкам или словам, если получится"""
+    parts = []
+    while len(text) > limit:
+        cut = max(text.rfind(sep, 0, limit) for sep in ("\n\n", "\n", " "))
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    parts.append(text)
+    return parts
+
+
+class InterpretationJob:
+    """Задание на интерпретацию: что спросить у GigaChat и какое сообщение обновить"""
+
+    def __init__(self, user_id: int, chat_id: int, message_id: int,
+                 question: str, situation: str, cards: List[str],
+                 render: Callable[[str], str],
+                 reply_markup: Optional[InlineKeyboardMarkup] = None,
+                 parse_mode: Optional[str] = "Markdown",
+                 charged: bool = True):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.question = question
+        self.situation = situation
+        self.cards = cards
+        self.render = render
+        self.reply_markup = reply_markup
+        self.parse_mode = parse_mode
+        # Списана ли попытка (подписчику с нулём попыток — нет): только её и возвращаем при ошибке
+        self.charged = charged
+        self.enqueued_at = time.monotonic()
+        # Апдейт, из обработчика которого поставлено задание, — для связи трасс в логе
+        origin = current_trace()
+        self.update_id = origin.update_id if origin else None
+
+
+class InterpretationQueue:
+    """Очередь интерпретаций с ограниченным числом воркеров.
+
+    Обработчик апдейта только ставит задание и сразу возвращается; воркер
+    вызывает GigaChat, редактирует сообщение-заглушку и сохраняет расклад.
+    У одного пользователя одновременно может быть только одно задание.
+    """
+
+    _queue: Optional[asyncio.Queue] = None
+    _workers: List[asyncio.Task] = []
+    _bot: Optional[Bot] = None
+    _active_users: Set[int] = set()
+    _running = 0
+    _wait_times: deque = deque(maxlen=200)
+
+    @classmethod
+    def start(cls, bot: Bot, workers: Optional[int] = None):
+        cls._bot = bot
+        cls._queue = asyncio.Queue()
+        cls._workers = [
+            asyncio.create_task(cls._worker())
+            for _ in range(workers or Config.INTERPRETATION_WORKERS)
+        ]
+        logger.info(f"Interpretation queue started with {len(cls._workers)} workers")
+
+    @classmethod
+    async def stop(cls):
+        """Останавливает воркеры; попытки по незавершённым заданиям возвращаются"""
+        for task in cls._workers:
+            task.cancel()
+        await asyncio.gather(*cls._workers, return_exceptions=True)
+        cls._workers = []
+        while cls._queue is not None and not cls._queue.empty():
+            job = cls._queue.get_nowait()
+            await cls._abort(job, "⚠️ Расклад прерван перезапуском бота, попытка возвращена.")
+        cls._active_users.clear()
+
+    @classmethod
+    def reserve(cls, user_id: int) -> bool:
+        """Занимает слот пользователя; False, если его расклад уже готовится"""
+        if user_id in cls._active_users:
+            return False
+        cls._active_users.add(user_id)
+        return True
+
+    @classmethod
+    def release(cls, user_id: int):
+        cls._active_users.discard(user_id)
+
+    @classmethod
+    def submit(cls, job: InterpretationJob):
+        """Ставит задание в очередь (слот пользователя должен быть занят через reserve)"""
+        if cls._queue is None:
+            raise RuntimeError("Interpretation queue is not started")
+        cls._active_users.add(job.user_id)
+        cls._queue.put_nowait(job)
+
+    @classmethod
+    def overloaded(cls) -> bool:
+        """В очереди не меньше INTERPRETATION_QUEUE_LIMIT заданий — новым раскладам отвечаем по шаблону"""
+        return cls._queue is not None and cls._queue.qsize() >= Config.INTERPRETATION_QUEUE_LIMIT
+
+    @classmethod
+    def stats(cls) -> dict:
+        """Глубина очереди и время ожидания — для админ-аналитики"""
+        waits = list(cls._wait_times)
+        return {
+            "depth": cls._queue.qsize() if cls._queue else 0,
+            "running": cls._running,
+            "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+            "max_wait": max(waits) if waits else 0.0,
+        }
+
+    @classmethod
+    async def _worker(cls):
+        while True:
+            job = await cls._queue.get()
+            started = time.monotonic()
+            wait = started - job.enqueued_at
+            cls._wait_times.append(wait)
+            cls._running += 1
+            # Своя трасса на задание: GigaChat, БД и правки сообщения идут здесь, вне апдейта
+            trace, token = start_trace("InterpretationQueue.job", job.update_id,
+                                       user_id=job.user_id, wait_ms=round(wait * 1000, 1))
+            try:
+                await cls._process(job)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    await cls._abort(job, "⚠️ Расклад прерван перезапуском бота, попытка возвращена.")
+                    raise
+                # Отменили не воркер, а задачу внутри обработки — воркер продолжает работу
+                logger.error(f"Interpretation for {job.user_id} was cancelled", exc_info=True)
+                await cls._abort(job, "❌ Произошла ошибка при генерации интерпретации. Попробуйте позже.")
+            except Exception as e:
+                logger.error(f"Interpretation worker error: {e}", exc_info=True)
+            finally:
+                finish_trace(trace, token, time.monotonic() - started, Config.SLOW_JOB_SECONDS, "interpretation job")
+                cls._running -= 1
+                cls.release(job.user_id)
+                cls._queue.task_done()
+
+    @classmethod
+    async def _stream(cls, job: InterpretationJob) -> str:
+        """Собирает потоковый ответ, периодически показывая накопленный текст"""
+        parts: List[str] = []
+        last_edit = time.monotonic()
+        async for chunk in TarotInterpreter.stream_interpretation(job.question, job.situation, job.cards):
+            parts.append(chunk)
+            now = time.monotonic()
+            # Не чаще раза в STREAM_EDIT_INTERVAL — иначе Telegram ответит RetryAfter
+            if now - last_edit >= Config.STREAM_EDIT_INTERVAL:
+                last_edit = now
+                partial = job.render("".join(parts) + " ▌")
+                await cls._edit(job, partial[:MessageLimit.MAX_TEXT_LENGTH], None, None)
+        return "".join(parts).strip()
+
+    @classmethod
+    async def _process(cls, job: InterpretationJob):
+        saved = False
+        try:
+            interpretation = await InterpretationCache.get(job.question, job.situation, job.cards)
+            if interpretation is None:
+                # Расклады без личной ситуации (карта дня/недели) одинаковы у многих пользователей —
+                # они идут через generate_interpretation, где одновременные запросы объединяются
+                if Config.GIGACHAT_STREAMING and job.situation.strip():
+                    interpretation = await cls._stream(job)
+                else:
+                    interpretation = await asyncio.wait_for(
+                        TarotInterpreter.generate_interpretation(job.question, job.situation, job.cards),
+                        timeout=Config.INTERPRETATION_TIMEOUT
+                    )
+                if interpretation in ERROR_MESSAGES:
+                    # GigaChat не ответил (или автомат открыт) — текст ошибки не сохраняем как расклад
+                    logger.error(f"GigaChat failed: {interpretation}")
+                    await cls._fallback(job, REASON_UNAVAILABLE)
+                    return
+                await InterpretationCache.put(job.question, job.situation, job.cards, interpretation)
+            if not interpretation:
+                raise ValueError("Empty interpretation received")
+
+            await save_reading(job.user_id, job.question, job.situation, job.cards, interpretation)
+            saved = True
+            await cls._deliver(job, job.render(interpretation))
+        except asyncio.TimeoutError:
+            logger.error("Timeout generating interpretation")
+            await cls._fallback(job, REASON_TIMEOUT)
+        except (GigaChatError, aiohttp.ClientError) as e:
+            logger.error(f"Error streaming interpretation: {e}")
+            await cls._fallback(job, REASON_UNAVAILABLE)
+        except Exception as e:
+            logger.error(f"Error generating interpretation: {str(e)}")
+            if saved:
+                return
+            await cls._abort(job, "❌ Произошла ошибка при генерации интерпретации. Попробуйте позже.")
+
+    @classmethod
+    async def _fallback(cls, job: InterpretationJob, reason: str):
+        """Вместо ошибки GigaChat — быстрый расклад по шаблону; попытка возвращается"""
+        await TemplateInterpreter.ensure_compiled()
+        interpretation = TemplateInterpreter.interpret(job.question, job.situation, job.cards)
+        if not interpretation:
+            await cls._abort(job, "❌ Произошла ошибка при генерации интерпретации. Попробуйте позже.")
+            return
+        await cls._refund(job)
+        interpretation += FALLBACK_NOTE.format(reason=reason)
+        try:
+            await save_reading(job.user_id, job.question, job.situation, job.cards, interpretation)
+        except Exception as e:
+            logger.error(f"Failed to save fallback reading for {job.user_id}: {e}")
+        await cls._deliver(job, job.render(interpretation))
+
+    @classmethod
+    async def _abort(cls, job: InterpretationJob, text: str):
+        await cls._refund(job)
+        await cls._edit(job, text, None, None)
+
+    @classmethod
+    async def _refund(cls, job: InterpretationJob):
+        """Возвращает списанную попытку (если она была списана)"""
+        if not job.charged:
+            return
+        try:
+            await update_attempts(job.user_id, 1)
+        except Exception as e:
+            logger.error(f"Failed to refund attempt for {job.user_id}: {e}")
+
+    @classmethod
+    async def _deliver(cls, job: InterpretationJob, text: str):
+        """Итоговый текст: первая часть — в заглушку, остальное — следующими сообщениями.
+        Клавиатура прикрепляется к последней части"""
+        parts = split_message(text)
+        await cls._edit(job, parts[0], job.reply_markup if len(parts) == 1 else None, job.parse_mode)
+        for i, part in enumerate(parts[1:], start=2):
+            markup = job.reply_markup if i == len(parts) else None
+            try:
+                await cls._bot.send_message(chat_id=job.chat_id, text=part,
+                                            reply_markup=markup, parse_mode=job.parse_mode)
+            except BadRequest as e:
+                if not (job.parse_mode and "parse" in str(e).lower()):
+                    logger.error(f"Failed to send interpretation part: {e}")
+                    continue
+                await cls._bot.send_message(chat_id=job.chat_id, text=part, reply_markup=markup)
+            except Exception as e:
+                logger.error(f"Failed to send interpretation part: {e}")
+
+    @classmethod
+    async def _edit(cls, job: InterpretationJob, text: str,
+                    reply_markup: Optional[InlineKeyboardMarkup], parse_mode: Optional[str]):
+        try:
+            await cls._bot.edit_message_text(
+                chat_id=job.chat_id,
+                message_id=job.message_id,
+                text=text,
+                reply_markup=reply_markup,
+                parse_mode=parse_mode
+            )
+        except BadRequest as e:
+            if parse_mode and "parse" in str(e).lower():
+                # Текст от модели может ломать разметку — отправляем без неё
+                await cls._bot.edit_message_text(
+                    chat_id=job.chat_id,
+                    message_id=job.message_id,
+                    text=text,
+                    reply_markup=reply_markup
+                )
+            elif "not modified" not in str(e).lower():
+                logger.error(f"Failed to update interpretation message: {e}")
+        except Exception as e:
+            logger.error(f"Failed to update interpretation message: {e}")
+
+
+INTERPRETATION_QUEUE.set_function(lambda: {
+    ("waiting",): InterpretationQueue._queue.qsize() if InterpretationQueue._queue else 0,
+    ("running",): InterpretationQueue._running,
+})
@@ -10,7 +10,17 @@ from telegram.ext import (
 )
 from config import Config 
 from bot.handlers import *
-from database import init_db
+from database import init_db, close_db
+from bot.broadcast import BroadcastEngine
+from bot.jobs import InterpretationQueue
+from bot.processor import PerChatUpdateProcessor
+from bot.pregeneration import ReadingPregenerator
+from bot.card_catalog import CALLBACK_ACTION as CARD_CALLBACK_ACTION, LEGACY_CALLBACK_PATTERN
+from bot.router import CallbackRouter
+from bot.persistence import SQLitePersistence
+from bot.webhook import WebhookServer
+from bot.template_interpreter import TemplateInterpreter
+from bot.instrumentation import InstrumentedRequest, instrument_handlers
 import signal
 
 
@@ -26,7 +36,11 @@ logger = logging.getLogger(__name__)
 
 async def post_init(application: Application) -> None:
     
-    """Действия после инициализации бота"""
+    """Действия после инициализации бота.
+
+    Хук билдера post_init вызывают только run_polling/run_webhook, а run_bot
+    запускает приложение вручную — поэтому он вызывает post_init сам.
+    """
     await application.bot.set_my_commands([
         ("start", "Запустить бота"),
         ("help", "Помощь")
@@ -34,6 +48,14 @@ async def post_init(application: Application) -> None:
     # Загружаем значения карт при старте
     await TarotInterpreter.load_meanings() 
     logger.info("Значения карт успешно загружены")
+    # Сетки карт по категориям для "Значений карт"
+    CardMeaningsHandler.build_card_grids()
+    # Шаблоны быстрого расклада (и запасного ответа без GigaChat)
+    await TemplateInterpreter.ensure_compiled()
+    # Общая сессия GigaChat с прогретым токеном
+    await TarotInterpreter.startup()
+    # Воркеры фоновой генерации интерпретаций
+    InterpretationQueue.start(application.bot)
 
 def setup_handlers(app: Application) -> None:
     """Настройка всех обработчиков"""
@@ -46,18 +68,12 @@ def setup_handlers(app: Application) -> None:
     # ✅ Оставляем один, который точно показывает помощь
     app.add_handler(CommandHandler("help", HelpHandler.show_help))
     app.add_handler(CommandHandler("admin", AdminHandler.admin_menu))
-
-    # Кнопки админа
-    app.add_handler(CallbackQueryHandler(AdminHandler.admin_analytics, pattern="^admin_analytics$"))
-    app.add_handler(CallbackQueryHandler(ReadingHandler.daily_reading, pattern="^daily_reading$"))
-    app.add_handler(CallbackQueryHandler(ReadingHandler.weekly_reading, pattern="^weekly_reading$"))
-    app.add_handler(CallbackQueryHandler(ReferralHandler.invite, pattern="^referral$"))
-
-    # Кнопка помощи
-    app.add_handler(CallbackQueryHandler(HelpHandler.show_help, pattern="^help$"))
+    app.add_handler(CommandHandler("profile", AdminHandler.toggle_profiling))
 
     # --- Консультации ---
     consultation_conv = ConversationHandler(
+        name="consultation",
+        persistent=True,
         entry_points=[
             CallbackQueryHandler(ConsultationHandler.start_consultation, pattern="^consultation$"),
             CallbackQueryHandler(ConsultationHandler.confirm_consultation, pattern="^confirm_consultation$")
@@ -76,14 +92,18 @@ def setup_handlers(app: Application) -> None:
 
     # --- Админ-панель ---
     admin_conv = ConversationHandler(
+        name="admin_users",
+        persistent=True,
         entry_points=[
             CallbackQueryHandler(AdminHandler.admin_users_menu, pattern="^admin_users$"),
-            CallbackQueryHandler(AdminHandler.admin_request_user_id, pattern="^admin_(add_attempts|remove_attempts|add_sub|cancel_sub)$")
+            CallbackQueryHandler(AdminHandler.admin_request_user_id, pattern="^admin_(add_attempts|remove_attempts|add_sub|cancel_sub)$"),
+            CallbackQueryHandler(AdminHandler.admin_user_search_menu, pattern="^admin_user_search$")
         ],
         states={
             "ADMIN_GET_USER_ID": [MessageHandler(filters.TEXT & ~filters.COMMAND, AdminHandler.admin_get_user_id)],
             "ADMIN_GET_ATTEMPTS": [MessageHandler(filters.TEXT & ~filters.COMMAND, AdminHandler.admin_get_attempts)],
-            "ADMIN_GET_SUB_TYPE": [CallbackQueryHandler(AdminHandler.admin_add_subscription, pattern="^admin_sub_")]
+            "ADMIN_GET_SUB_TYPE": [CallbackQueryHandler(AdminHandler.admin_add_subscription, pattern="^admin_sub_")],
+            "ADMIN_USER_SEARCH": [MessageHandler(filters.TEXT & ~filters.COMMAND, AdminHandler.admin_user_search)]
         },
         fallbacks=[
             CallbackQueryHandler(AdminHandler.admin_users_menu, pattern="^admin_back$"),
@@ -97,6 +117,8 @@ def setup_handlers(app: Application) -> None:
     app.add_handler(admin_conv)
 
     admin_broadcast_conv = ConversationHandler(
+        name="admin_broadcast",
+        persistent=True,
         entry_points=[CallbackQueryHandler(AdminHandler.admin_broadcast_menu, pattern="^admin_broadcast$")],
         states={
             "ADMIN_BROADCAST": [MessageHandler(filters.TEXT | filters.PHOTO, AdminHandler.process_broadcast)]
@@ -114,6 +136,8 @@ def setup_handlers(app: Application) -> None:
     app.add_handler(admin_broadcast_conv)
 
     admin_sendmsg_conv = ConversationHandler(
+        name="admin_send_message",
+        persistent=True,
         entry_points=[
             CallbackQueryHandler(AdminHandler.admin_send_message_menu, pattern="^admin_send_msg$")
         ],
@@ -139,13 +163,11 @@ def setup_handlers(app: Application) -> None:
     app.add_handler(admin_sendmsg_conv)
 
 
-    # Список пользователей
-    app.add_handler(CallbackQueryHandler(AdminHandler.admin_list_users, pattern="^admin_list_users$"))
-
-
     # --- Индивидуальный расклад ---
     reading_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(ReadingHandler.begin_reading, pattern="^request_reading$")],
+        name="reading",
+        persistent=True,
+        entry_points=[CallbackQueryHandler(ReadingHandler.begin_reading, pattern="^(request_reading|quick_reading)$")],
         states={
             QUESTION:   [MessageHandler(filters.TEXT & ~filters.COMMAND, ReadingHandler.process_question)],
             SITUATION:  [MessageHandler(filters.TEXT & ~filters.COMMAND, ReadingHandler.process_situation)],
@@ -167,13 +189,10 @@ def setup_handlers(app: Application) -> None:
     )
     app.add_handler(reading_conv)
 
-    # Значения карт
-    app.add_handler(CallbackQueryHandler(CardMeaningsHandler.show_categories, pattern="^card_meanings$"))
-    app.add_handler(CallbackQueryHandler(CardMeaningsHandler.show_cards, pattern="^(major_arcana|wands|cups|swords|pentacles)$"))
-    app.add_handler(CallbackQueryHandler(CardMeaningsHandler.show_meaning, pattern=r"^meaning_.+_[01]$"))
-
     # Поиск карты (оставлена ровно одна process_search в handlers.py)
     search_conv = ConversationHandler(
+        name="card_search",
+        persistent=True,
         entry_points=[CallbackQueryHandler(CardMeaningsHandler.start_search, pattern="^search_card$")],
         states={"SEARCH_CARD": [MessageHandler(filters.TEXT & ~filters.COMMAND, CardMeaningsHandler.process_search)]},
         fallbacks=[
@@ -183,12 +202,10 @@ def setup_handlers(app: Application) -> None:
     )
     app.add_handler(search_conv)
 
-    # Подписки
-    app.add_handler(CallbackQueryHandler(SubscriptionHandler.show_subscriptions, pattern="^subscription$"))
-    app.add_handler(CallbackQueryHandler(SubscriptionHandler.handle_subscription, pattern="^sub_(monthly|5|10|15)$"))
-
     # Заказ вопроса админу
     admin_order_conv = ConversationHandler(
+        name="admin_order",
+        persistent=True,
         entry_points=[CallbackQueryHandler(AdminHandler.forward_to_admin, pattern="^order_from_admin$")],
         states={ASK_QUESTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, AdminHandler.process_admin_question)]},
         fallbacks=[
@@ -199,30 +216,73 @@ def setup_handlers(app: Application) -> None:
     )
     app.add_handler(admin_order_conv)
 
+    # Все кнопки вне диалогов — один роутер: поиск обработчика по словарю, а не перебор регулярок.
+    # Стоит после диалогов, чтобы их состояния и fallbacks получали свои кнопки первыми.
+    router = CallbackRouter()
+    # Админ
+    router.route("admin_analytics", AdminHandler.admin_analytics)
+    router.route("admin_list_users", AdminHandler.admin_list_users)
+    router.route("au", AdminHandler.admin_users_page)
+    router.route("aud", AdminHandler.admin_user_detail)
+    router.route("admin_stats_30d", AdminHandler.admin_stats_history)
+    # Расклады и помощь
+    router.route("daily_reading", ReadingHandler.daily_reading)
+    router.route("weekly_reading", ReadingHandler.weekly_reading)
+    router.route("referral", ReferralHandler.invite)
+    router.route("help", HelpHandler.show_help)
+    # Значения карт
+    router.route("card_meanings", CardMeaningsHandler.show_categories)
+    for category in CARD_CATEGORIES:
+        router.route(category, CardMeaningsHandler.show_cards)
+    router.route(CARD_CALLBACK_ACTION, CardMeaningsHandler.show_meaning)
+    # Подписки
+    router.route("subscription", SubscriptionHandler.show_subscriptions)
+    for sub_type in SubscriptionHandler.SUBSCRIPTION_TYPES:
+        router.route(f"sub_{sub_type}", SubscriptionHandler.handle_subscription)
     # Общие кнопки
-    app.add_handler(CallbackQueryHandler(StartHandler.start, pattern="^start_over$"))
-    app.add_handler(CallbackQueryHandler(BaseHandler.back_handler, pattern="^back$"))
+    router.route("start_over", StartHandler.start)
+    router.route("back", BaseHandler.back_handler)
+    app.add_handler(router)
+
+    # Кнопки значений карт из сообщений, отправленных до перехода на id
+    app.add_handler(CallbackQueryHandler(CardMeaningsHandler.show_meaning, pattern=LEGACY_CALLBACK_PATTERN))
 
     # 🛡️ Последний перехватчик — в самом конце, как и был
     app.add_handler(MessageHandler(filters.ALL, StartHandler.start))
 
+    # Время и ошибки каждого обработчика — в метрики /metrics
+    instrument_handlers(app)
+
 async def run_bot() -> None:
     """Основная функция запуска бота"""
     application = None
+    server = None
     try:
         await init_db()
         
+        # Разные пользователи обрабатываются параллельно, апдейты одного чата — по порядку
         application = Application.builder() \
             .token(Config.TELEGRAM_TOKEN) \
-            .post_init(post_init) \
+            .request(InstrumentedRequest(connection_pool_size=256)) \
+            .concurrent_updates(PerChatUpdateProcessor(Config.CONCURRENT_UPDATES)) \
+            .persistence(SQLitePersistence()) \
             .build()
         
         setup_handlers(application)
         
         logger.info("Бот запущен и работает...")
         await application.initialize()
+        await post_init(application)
         await application.start()
-        await application.updater.start_polling()
+        # Ночная подготовка карт дня и недели (JobQueue запущен вместе с приложением)
+        ReadingPregenerator.schedule(application.job_queue, TAROT_DECK)
+        # Продолжаем рассылки, прерванные перезапуском
+        await BroadcastEngine.resume_unfinished(application.bot)
+        # HTTP-сервер: /healthz и /metrics всегда, приём апдейтов — если задан WEBHOOK_URL
+        server = WebhookServer(application)
+        await server.start()
+        if not Config.WEBHOOK_URL:
+            await application.updater.start_polling()
         
         # Бесконечный цикл ожидания
         while True:
@@ -233,7 +293,20 @@ async def run_bot() -> None:
     except Exception as e:
         logger.exception(f"Ошибка в run_bot: {str(e)}")
     finally:
+        if server:
+            try:
+                await server.stop()
+            except Exception as e:
+                logger.error(f"Ошибка при остановке HTTP-сервера: {str(e)}")
         if application:
+            try:
+                await BroadcastEngine.stop_all()
+            except Exception as e:
+                logger.error(f"Ошибка при остановке рассылок: {str(e)}")
+            try:
+                await InterpretationQueue.stop()
+            except Exception as e:
+                logger.error(f"Ошибка при остановке очереди интерпретаций: {str(e)}")
             try:
                 logger.info("Остановка бота...")
                 if application.updater.running:
@@ -243,6 +316,14 @@ async def run_bot() -> None:
                 await application.shutdown()
             except Exception as e:
                 logger.error(f"Ошибка при остановке: {str(e)}")
+        try:
+            await TarotInterpreter.shutdown()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии клиента GigaChat: {str(e)}")
+        try:
+            await close_db()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии БД: {str(e)}")
         logger.info("Бот полностью остановлен")
 
 async def shutdown(signal, loop, app):
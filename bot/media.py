@@ -0,0 +1,94 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+from telegram import Bot, Message
+from telegram.error import BadRequest
+
+from config import BASE_DIR
+from database import get_media_file_id, save_media_file_id, delete_media_file_id
+
+logger = logging.getLogger(__name__)
+
+
+class MediaRegistry:
+    """Загружает картинки в Telegram один раз и дальше шлёт их по file_id"""
+
+    _file_ids: Dict[str, str] = {}
+    _hashes: Dict[str, str] = {}
+
+    @staticmethod
+    def _local_path(source: str) -> Optional[Path]:
+        if source.startswith(("http://", "https://")):
+            return None
+        for path in (Path(source), BASE_DIR / source):
+            if path.is_file():
+                return path
+        return None
+
+    @classmethod
+    def _hash(cls, source: str) -> str:
+        """Ключ ресурса: sha256 содержимого файла или URL"""
+        if source not in cls._hashes:
+            path = cls._local_path(source)
+            data = path.read_bytes() if path else source.encode("utf-8")
+            cls._hashes[source] = hashlib.sha256(data).hexdigest()
+        return cls._hashes[source]
+
+    @classmethod
+    async def _cached_file_id(cls, file_hash: str) -> Optional[str]:
+        if file_hash not in cls._file_ids:
+            try:
+                file_id = await get_media_file_id(file_hash)
+            except Exception as e:
+                logger.warning(f"Media cache lookup failed: {e}")
+                return None
+            if not file_id:
+                return None
+            cls._file_ids[file_hash] = file_id
+        return cls._file_ids[file_hash]
+
+    @classmethod
+    async def _forget(cls, file_hash: str):
+        cls._file_ids.pop(file_hash, None)
+        try:
+            await delete_media_file_id(file_hash)
+        except Exception as e:
+            logger.warning(f"Media cache cleanup failed: {e}")
+
+    @classmethod
+    async def _remember(cls, file_hash: str, message: Message):
+        if not message or not message.photo:
+            return
+        file_id = message.photo[-1].file_id
+        cls._file_ids[file_hash] = file_id
+        try:
+            await save_media_file_id(file_hash, file_id)
+        except Exception as e:
+            logger.warning(f"Media cache save failed: {e}")
+
+    @classmethod
+    async def send_photo(cls, bot: Bot, chat_id: int, source: str, **kwargs) -> Message:
+        """send_photo с повторным использованием file_id; при отказе Telegram — загрузка заново"""
+        file_hash = cls._hash(source)
+
+        file_id = await cls._cached_file_id(file_hash)
+        if file_id:
+            try:
+                return await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+            except BadRequest as e:
+                if "file" not in str(e).lower():
+                    raise
+                logger.warning(f"Cached file_id rejected for {source}: {e}, re-uploading")
+                await cls._forget(file_hash)
+
+        path = cls._local_path(source)
+        if path:
+            with open(path, "rb") as f:
+                message = await bot.send_photo(chat_id=chat_id, photo=f, **kwargs)
+        else:
+            message = await bot.send_photo(chat_id=chat_id, photo=source, **kwargs)
+
+        await cls._remember(file_hash, message)
+        return message
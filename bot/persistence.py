@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+import pickle
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from config import Config
+from database import load_persistence, write_persistence
+from metrics import CONVERSATION_STATES
+
+logger = logging.getLogger(__name__)
+
+ConversationKey = Tuple[Any, ...]
+
+
+class SQLitePersistence(BasePersistence):
+    """Персистентность PTB в таблице persistence основной БД.
+
+    Каждая запись (user_data пользователя, chat_data чата, состояние диалога)
+    хранится отдельной строкой. update_* только запоминают снимок изменённого
+    ключа; накопленные изменения пишутся одной транзакцией через
+    PERSISTENCE_FLUSH_DELAY секунд. Неизменившиеся снимки не перезаписываются.
+    """
+
+    def __init__(self, update_interval: Optional[float] = None):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval or Config.PERSISTENCE_INTERVAL
+        )
+        # (kind, key) -> снимок для записи или None для удаления
+        self._dirty: Dict[Tuple[str, str], Optional[bytes]] = {}
+        # (kind, key) -> хэш последнего записанного снимка
+        self._written: Dict[Tuple[str, str], int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        # имя диалога -> {ключ чата: состояние}; для метрики занятости состояний
+        self._conversation_states: Dict[str, Dict[ConversationKey, object]] = {}
+        CONVERSATION_STATES.set_function(self.conversation_occupancy)
+
+    # --- загрузка ---
+
+    async def _load(self, kind: str) -> Dict[str, Any]:
+        result = {}
+        for key, data in await load_persistence(kind):
+            self._written[(kind, key)] = hash(bytes(data))
+            try:
+                result[key] = pickle.loads(data)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable persisted {kind} {key}: {e}")
+        return result
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {int(key): value for key, value in (await self._load("user")).items()}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {int(key): value for key, value in (await self._load("chat")).items()}
+
+    async def get_bot_data(self) -> dict:
+        return (await self._load("bot")).get("bot", {})
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[ConversationKey, object]:
+        conversations = {
+            tuple(json.loads(key)): state
+            for key, state in (await self._load(f"conversation:{name}")).items()
+        }
+        self._conversation_states[name] = dict(conversations)
+        return conversations
+
+    def conversation_occupancy(self) -> Dict[Tuple[str, str], int]:
+        """(диалог, состояние) -> сколько чатов в нём сейчас"""
+        return dict(Counter(
+            (name, str(state))
+            for name, states in self._conversation_states.items()
+            for state in states.values()
+        ))
+
+    # --- изменения ---
+
+    def _mark(self, kind: str, key: str, value: Any):
+        # Снимок берётся сразу: PTB передаёт живые словари, которые продолжат меняться
+        self._dirty[(kind, key)] = None if value is None else pickle.dumps(value)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._mark("user", str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._mark("chat", str(chat_id), data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._mark("bot", "bot", data)
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: Optional[object]) -> None:
+        states = self._conversation_states.setdefault(name, {})
+        if new_state is None:
+            states.pop(key, None)
+        else:
+            states[key] = new_state
+        self._mark(f"conversation:{name}", json.dumps(list(key)), new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._mark("user", str(user_id), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._mark("chat", str(chat_id), None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # --- запись ---
+
+    async def _flush_later(self):
+        await asyncio.sleep(Config.PERSISTENCE_FLUSH_DELAY)
+        try:
+            await self._write()
+        except Exception as e:
+            logger.error(f"Persistence flush failed: {e}")
+
+    async def _write(self):
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, {}
+            upserts, deletes = [], []
+            for (kind, key), data in dirty.items():
+                if data is None:
+                    if self._written.pop((kind, key), None) is not None:
+                        deletes.append((kind, key))
+                    continue
+                digest = hash(data)
+                if self._written.get((kind, key)) != digest:
+                    upserts.append((kind, key, data))
+            if not upserts and not deletes:
+                return
+            try:
+                await write_persistence(upserts, deletes)
+            except BaseException:
+                # Транзакция откатилась — возвращаем изменения, если их не перекрыли более свежие
+                for kind_key, data in dirty.items():
+                    self._dirty.setdefault(kind_key, data)
+                for kind, key in deletes:
+                    self._written[(kind, key)] = 0
+                raise
+            for kind, key, data in upserts:
+                self._written[(kind, key)] = hash(data)
+
+    async def flush(self) -> None:
+        """Вызывается PTB при остановке: дописываем всё накопленное"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self._write()
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from datetime import datetime, time as dtime, timedelta, timezone
+from typing import Iterable, List, Optional
+
+from telegram.ext import ContextTypes, JobQueue
+
+from config import Config
+from database import (
+    get_prepared_reading, get_prepared_cards, save_prepared_reading, delete_old_prepared_readings
+)
+from tarot_interpreter import TarotInterpreter
+from bot.interpretation_cache import InterpretationCache
+
+logger = logging.getLogger(__name__)
+
+DAILY_QUESTION = "Что меня ждет сегодня?"
+WEEKLY_QUESTION = "Что меня ждет на этой неделе?"
+
+PERIOD_QUESTIONS = {
+    "daily": DAILY_QUESTION,
+    "weekly": WEEKLY_QUESTION,
+}
+
+
+def period_key(period: str, when: Optional[datetime] = None) -> str:
+    """Ключ периода по UTC: дата для карты дня, ISO-неделя для карты недели"""
+    when = when or datetime.now(timezone.utc)
+    if period == "weekly":
+        year, week, _ = when.isocalendar()
+        return f"{year}-W{week:02d}"
+    return when.date().isoformat()
+
+
+class ReadingPregenerator:
+    """Заранее генерирует карты дня и недели для всей колоды.
+
+    Ночная задача JobQueue готовит интерпретации на следующий период с
+    ограниченной параллельностью; daily_reading/weekly_reading берут их из
+    таблицы prepared_readings, а к GigaChat идут, только если заготовки нет.
+    """
+
+    _deck: List[str] = []
+    _lock = asyncio.Lock()
+
+    @classmethod
+    def schedule(cls, job_queue: Optional[JobQueue], deck: Iterable[str]) -> bool:
+        cls._deck = list(deck)
+        if job_queue is None:
+            logger.warning("JobQueue is not available (install python-telegram-bot[job-queue]), "
+                           "readings will be generated on demand")
+            return False
+        job_queue.run_daily(
+            cls._nightly_job,
+            time=dtime(hour=Config.PREGENERATION_HOUR, tzinfo=timezone.utc),
+            name="pregenerate_readings"
+        )
+        # Добираем текущий период, если бот запустился после ночной задачи
+        job_queue.run_once(cls._current_period_job, when=60, name="pregenerate_current_readings")
+        return True
+
+    @classmethod
+    async def lookup(cls, period: str, card: str) -> Optional[str]:
+        """Готовая интерпретация карты на текущий период или None"""
+        try:
+            return await get_prepared_reading(period, period_key(period), card)
+        except Exception as e:
+            logger.warning(f"Prepared reading lookup failed: {e}")
+            return None
+
+    @classmethod
+    async def fill(cls, period: str, key: str) -> int:
+        """Генерирует недостающие интерпретации периода; возвращает число новых"""
+        question = PERIOD_QUESTIONS[period]
+        async with cls._lock:
+            ready = await get_prepared_cards(period, key)
+            missing = [card for card in cls._deck if card not in ready]
+            if not missing:
+                return 0
+            logger.info(f"Pregenerating {len(missing)} {period} readings for {key}")
+
+            semaphore = asyncio.Semaphore(Config.PREGENERATION_CONCURRENCY)
+
+            async def generate(card: str) -> bool:
+                async with semaphore:
+                    interpretation = await asyncio.wait_for(
+                        TarotInterpreter.generate_interpretation(question, "", [card]),
+                        timeout=Config.INTERPRETATION_TIMEOUT
+                    )
+                if not InterpretationCache.is_reusable(question, "", [card], interpretation):
+                    return False
+                await save_prepared_reading(period, key, card, interpretation)
+                return True
+
+            results = await asyncio.gather(*(generate(card) for card in missing), return_exceptions=True)
+            created = sum(1 for result in results if result is True)
+            failed = len(results) - created
+            if failed:
+                logger.warning(f"Pregeneration {period} {key}: {failed} readings failed, live fallback will cover them")
+            logger.info(f"Pregeneration {period} {key}: {created} readings stored")
+            return created
+
+    @classmethod
+    async def _nightly_job(cls, context: ContextTypes.DEFAULT_TYPE):
+        tomorrow = datetime.now(timezone.utc) + timedelta(days=1)
+        for period in PERIOD_QUESTIONS:
+            try:
+                await cls.fill(period, period_key(period, tomorrow))
+            except Exception as e:
+                logger.error(f"Pregeneration of {period} readings failed: {e}", exc_info=True)
+        try:
+            await delete_old_prepared_readings()
+        except Exception as e:
+            logger.warning(f"Prepared readings cleanup failed: {e}")
+
+    @classmethod
+    async def _current_period_job(cls, context: ContextTypes.DEFAULT_TYPE):
+        for period in PERIOD_QUESTIONS:
+            try:
+                await cls.fill(period, period_key(period))
+            except Exception as e:
+                logger.error(f"Pregeneration of {period} readings failed: {e}", exc_info=True)
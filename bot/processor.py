@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка апдейтов с сохранением порядка внутри чата.
+
+    Апдейты разных чатов обрабатываются одновременно (не больше
+    max_concurrent_updates), а апдейты одного чата — строго по очереди,
+    чтобы состояние ConversationHandler и user_data не перемешивалось.
+    Блокировка чата берётся до слота обработки, поэтому один активный
+    пользователь не занимает все слоты своими ожидающими апдейтами.
+    """
+
+    __slots__ = ("_handler_slots", "_chat_locks")
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: Optional[int] = None):
+        super().__init__(max_pending_updates or max_concurrent_updates * 8)
+        self._handler_slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # chat_id -> [lock, число апдейтов, ожидающих или держащих lock]
+        self._chat_locks: Dict[int, list] = {}
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[int]:
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._chat_key(update)
+        if key is None:
+            async with self._handler_slots:
+                await coroutine
+            return
+
+        entry = self._chat_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._handler_slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._chat_locks.pop(key, None)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._chat_locks.clear()
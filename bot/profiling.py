@@ -0,0 +1,119 @@
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import time
+from datetime import datetime
+from typing import Optional
+
+from telegram import Bot, InputFile
+
+from config import Config
+
+try:
+    import yappi
+except ImportError:
+    yappi = None
+
+logger = logging.getLogger(__name__)
+
+MAX_SECONDS = 600
+
+# cProfile — детерминированный трассировщик: хук на каждый вызов и возврат
+CPROFILE_NOTE = ("⚠️ yappi не установлен, работает cProfile: пока идёт захват, "
+                 "бот отвечает медленнее — обычно в 1,5–2 раза на коде с частыми вызовами")
+
+
+class Profiler:
+    """Профилирование живого процесса по команде администратора.
+
+    Захват идёт N секунд в фоне (обработчики продолжают работать), затем
+    администратору приходит документ с топом функций по накопленному
+    времени. Если установлен yappi — считается wall-time с учётом корутин,
+    иначе используется cProfile из стандартной библиотеки: он ловит весь
+    код потока event loop, включая ожидание внутри самого цикла, и заметно
+    замедляет процесс на время захвата (см. CPROFILE_NOTE).
+    """
+
+    _task: Optional[asyncio.Task] = None
+    _stop: Optional[asyncio.Event] = None
+
+    @classmethod
+    def running(cls) -> bool:
+        return cls._task is not None and not cls._task.done()
+
+    @staticmethod
+    def engine() -> str:
+        return "yappi" if yappi is not None else "cProfile"
+
+    @classmethod
+    def start(cls, bot: Bot, chat_id: int, seconds: int) -> int:
+        """Запускает захват; возвращает фактическую длительность в секундах"""
+        seconds = max(1, min(seconds, MAX_SECONDS))
+        cls._stop = asyncio.Event()
+        cls._task = asyncio.create_task(cls._capture(bot, chat_id, seconds, cls._stop))
+        return seconds
+
+    @classmethod
+    def stop(cls):
+        """Досрочно завершает захват — отчёт придёт за фактически прошедшее время"""
+        if cls._stop is not None:
+            cls._stop.set()
+
+    @classmethod
+    async def _capture(cls, bot: Bot, chat_id: int, seconds: int, stop: asyncio.Event):
+        started = time.monotonic()
+        engine = cls.engine()
+        profiler = None
+        if yappi is not None:
+            yappi.clear_stats()
+            yappi.set_clock_type("wall")
+            yappi.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=seconds)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            else:
+                yappi.stop()
+
+        elapsed = time.monotonic() - started
+        report = cls._report(profiler, engine, elapsed)
+        filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt"
+        caption = f"🧪 Профиль за {elapsed:.0f} с ({engine}), топ-{Config.PROFILE_TOP} функций"
+        if profiler is not None:
+            caption += "\nВремена завышены накладными расходами cProfile"
+        try:
+            await bot.send_document(
+                chat_id=chat_id,
+                document=InputFile(io.BytesIO(report.encode("utf-8")), filename=filename),
+                caption=caption
+            )
+        except Exception as e:
+            logger.error(f"Failed to send profile report: {e}")
+        logger.info(f"Profile captured with {engine} for {elapsed:.1f}s")
+
+    @staticmethod
+    def _report(profiler: Optional[cProfile.Profile], engine: str, elapsed: float) -> str:
+        stream = io.StringIO()
+        stream.write(f"{engine}, {elapsed:.1f} s\n\n")
+        if profiler is not None:
+            stats = pstats.Stats(profiler, stream=stream)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(Config.PROFILE_TOP)
+            stream.write("\n")
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(Config.PROFILE_TOP)
+        else:
+            stream.write(f"{'ttot':>10} {'tsub':>10} {'ncall':>8}  function\n")
+            for stat in list(yappi.get_func_stats().sort("ttot"))[:Config.PROFILE_TOP]:
+                stream.write(
+                    f"{stat.ttot:10.4f} {stat.tsub:10.4f} {stat.ncall:8d}  "
+                    f"{stat.full_name}\n"
+                )
+        return stream.getvalue()
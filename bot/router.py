@@ -0,0 +1,71 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import BaseHandler, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+Callback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[Any]]
+
+# Лимит Telegram на callback_data
+MAX_CALLBACK_DATA = 64
+
+
+def pack(action: str, *args: Any) -> str:
+    """callback_data вида action:arg1:arg2"""
+    data = ":".join([action, *map(str, args)])
+    if len(data.encode("utf-8")) > MAX_CALLBACK_DATA:
+        raise ValueError(f"callback_data is too long: {data!r}")
+    return data
+
+
+def unpack(data: str) -> Tuple[str, List[str]]:
+    action, *args = data.split(":")
+    return action, args
+
+
+class CallbackRouter(BaseHandler):
+    """Один обработчик для всех кнопок вне диалогов.
+
+    Вместо цепочки CallbackQueryHandler с регулярными выражениями обработчик
+    ищется в словаре: сначала по callback_data целиком (старые кнопки вида
+    "daily_reading"), затем по action — части до первого ":".
+    ConversationHandler'ы регистрируются до роутера и, как и раньше, первыми
+    получают кнопки своих состояний и fallbacks.
+    """
+
+    def __init__(self, block: bool = True):
+        # Сам обработчик выбирается в check_update, callback базового класса не вызывается
+        super().__init__(self._unrouted, block=block)
+        self._routes: Dict[str, Callback] = {}
+
+    @staticmethod
+    async def _unrouted(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        logger.warning(f"No route for callback {update.callback_query.data!r}")
+
+    def route(self, action: str, callback: Callback) -> "CallbackRouter":
+        if action in self._routes:
+            raise ValueError(f"Duplicate callback route: {action}")
+        self._routes[action] = callback
+        return self
+
+    def wrap_routes(self, wrap: Callable[[Callback], Callback]):
+        """Оборачивает обработчики всех маршрутов (например, для метрик)"""
+        self._routes = {action: wrap(callback) for action, callback in self._routes.items()}
+
+    def check_update(self, update: object) -> Optional[Callback]:
+        if not (isinstance(update, Update) and update.callback_query):
+            return None
+        data = update.callback_query.data
+        if not isinstance(data, str):
+            return None
+        callback = self._routes.get(data)
+        if callback is None:
+            callback = self._routes.get(data.split(":", 1)[0])
+        return callback
+
+    async def handle_update(self, update: Update, application, check_result: Callback,
+                            context: ContextTypes.DEFAULT_TYPE):
+        self.collect_additional_context(context, update, application, check_result)
+        return await check_result(update, context)
@@ -0,0 +1,58 @@
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+class Screen(NamedTuple):
+    """Готовый экран: текст и клавиатура (объекты telegram неизменяемы, их можно переиспользовать)"""
+    text: Optional[str]
+    reply_markup: Optional[InlineKeyboardMarkup]
+    parse_mode: Optional[str] = None
+
+
+def build_keyboard(buttons: Sequence[Tuple[str, str]], columns: int = 2) -> InlineKeyboardMarkup:
+    """Inline-клавиатура из пар (текст, callback_data) по columns кнопок в ряд"""
+    keyboard = []
+    row = []
+
+    for i, (text, data) in enumerate(buttons, 1):
+        row.append(InlineKeyboardButton(text, callback_data=data))
+        if i % columns == 0 or i == len(buttons):
+            keyboard.append(row)
+            row = []
+
+    return InlineKeyboardMarkup(keyboard)
+
+
+class ScreenRegistry:
+    """Реестр статических экранов и клавиатур, собранных один раз при старте"""
+
+    def __init__(self):
+        self._screens: Dict[str, Screen] = {}
+
+    def register(self, key: str, text: Optional[str] = None,
+                 buttons: Optional[Sequence[Tuple[str, str]]] = None, columns: int = 2,
+                 rows: Optional[List[List[InlineKeyboardButton]]] = None,
+                 parse_mode: Optional[str] = None) -> Screen:
+        """Регистрирует экран: кнопки парами (buttons) или готовыми рядами (rows)"""
+        if rows is not None:
+            markup = InlineKeyboardMarkup(rows)
+        elif buttons is not None:
+            markup = build_keyboard(buttons, columns)
+        else:
+            markup = None
+        screen = Screen(text, markup, parse_mode)
+        self._screens[key] = screen
+        return screen
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._screens
+
+    def __getitem__(self, key: str) -> Screen:
+        return self._screens[key]
+
+    def get(self, key: str) -> Optional[Screen]:
+        return self._screens.get(key)
+
+    def keyboard(self, key: str) -> InlineKeyboardMarkup:
+        return self._screens[key].reply_markup
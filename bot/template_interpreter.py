@@ -0,0 +1,166 @@
+import logging
+from collections import Counter
+from typing import Dict, List, NamedTuple
+
+from tarot_interpreter import TarotInterpreter
+
+logger = logging.getLogger(__name__)
+
+MAJOR_ARCANA = "Старшие Арканы"
+
+# О чём говорит масть (или Старшие Арканы), когда она задаёт тон раскладу
+CATEGORY_THEMES = {
+    MAJOR_ARCANA: "крупные жизненные перемены",
+    "Жезлы": "энергия, действия и работа",
+    "Кубки": "чувства и отношения",
+    "Мечи": "мысли, решения и конфликты",
+    "Пентакли": "деньги, быт и практические дела",
+}
+
+# Приписка к быстрому раскладу, который выдан вместо ответа GigaChat
+FALLBACK_NOTE = "\n\n⚡ Быстрый расклад по значениям карт: {reason}. Попытка не списана."
+REASON_UNAVAILABLE = "GigaChat сейчас недоступен"
+REASON_TIMEOUT = "GigaChat не успел ответить"
+REASON_BUSY = "очередь раскладов переполнена"
+
+
+class CardPhrases(NamedTuple):
+    """Готовые фразы карты для шаблона"""
+    category: str
+    essence: str   # "Начало нового пути, спонтанность, невинность."
+    upright: str   # "новые начинания, свобода, приключения"
+    caution: str   # "безрассудство, задержки, незрелость"
+    strength: str  # первый пункт upright: "новые начинания"
+    risk: str      # первый пункт reversed: "безрассудство"
+
+
+def _sentence(text: str) -> str:
+    text = text.strip()
+    if not text:
+        return ""
+    text = text[0].upper() + text[1:]
+    return text if text[-1] in ".!?" else text + "."
+
+
+def _lower_first(text: str) -> str:
+    text = text.strip().rstrip(".")
+    return text[0].lower() + text[1:] if text else text
+
+
+class TemplateInterpreter:
+    """Локальный расклад без GigaChat из data/card_meanings.json.
+
+    compile() один раз разбирает значения карт на готовые фразы, interpret()
+    только склеивает их по тому же шаблону ✨/⭐️, что и промпт GigaChat,
+    добавляя простые правила сочетаний мастей и Арканов. Ответ строится за
+    доли миллисекунды и не зависит от сети.
+    """
+
+    _cards: Dict[str, CardPhrases] = {}
+
+    @classmethod
+    def compile(cls, meanings: Dict[str, dict]):
+        cards = {}
+        for card_name, card_data in meanings.items():
+            if not card_data:
+                continue
+            upright = _lower_first(card_data.get("upright", ""))
+            caution = _lower_first(card_data.get("reversed", ""))
+            cards[card_name] = CardPhrases(
+                category=card_data.get("category", ""),
+                essence=_sentence(card_data.get("meaning", "")),
+                upright=upright,
+                caution=caution,
+                strength=upright.split(",")[0].strip(),
+                risk=caution.split(",")[0].strip()
+            )
+        cls._cards = cards
+        logger.info(f"Template interpreter compiled for {len(cards)} cards")
+
+    @classmethod
+    async def ensure_compiled(cls):
+        """Компилирует шаблоны при первом обращении, если это не сделали при старте"""
+        if cls._cards:
+            return
+        if not TarotInterpreter._card_meanings:
+            await TarotInterpreter.load_meanings()
+        cls.compile(TarotInterpreter._card_meanings)
+
+    @classmethod
+    def can_interpret(cls, cards: List[str]) -> bool:
+        return bool(cards) and all(card in cls._cards for card in cards)
+
+    @staticmethod
+    def _combination(phrases: CardPhrases, other: str, other_phrases: CardPhrases) -> str:
+        """Как карта сочетается с соседней"""
+        if phrases.category == other_phrases.category:
+            theme = CATEGORY_THEMES.get(phrases.category, "общая тема")
+            return f"Вместе с картой «{other}» усиливает одну линию: {theme}."
+        if phrases.category == MAJOR_ARCANA:
+            return f"Задаёт тон раскладу — карта «{other}» показывает, где это проявится."
+        if other_phrases.category == MAJOR_ARCANA:
+            return f"Карта «{other}» придаёт этому вес: это не мелочь, а часть большого поворота."
+        return (
+            f"С картой «{other}» связывает две сферы: "
+            f"{CATEGORY_THEMES.get(phrases.category, phrases.category)} и "
+            f"{CATEGORY_THEMES.get(other_phrases.category, other_phrases.category)}."
+        )
+
+    @classmethod
+    def _summary(cls, question: str, cards: List[str], phrases: List[CardPhrases]) -> List[str]:
+        if len(cards) == 1:
+            theme = CATEGORY_THEMES.get(phrases[0].category, "ваша ситуация")
+            return [
+                f"Ответ на вопрос «{question.strip()[:100]}» лежит в теме: {theme}.",
+                f"Сейчас на первом плане — {phrases[0].upright}."
+            ]
+
+        lines = []
+        categories = Counter(p.category for p in phrases)
+        if categories[MAJOR_ARCANA] * 2 >= len(cards):
+            lines.append("В раскладе много Старших Арканов — ситуацию определяют крупные обстоятельства, а не случайности.")
+        suit, count = max(
+            ((category, n) for category, n in categories.items() if category != MAJOR_ARCANA),
+            key=lambda item: item[1], default=(None, 0)
+        )
+        if count >= 2 and list(categories.values()).count(count) == 1:
+            lines.append(f"Преобладают {suit}: главная тема — {CATEGORY_THEMES.get(suit, suit)}.")
+        lines.append(
+            f"Карты выстраивают путь от «{phrases[0].strength}» ({cards[0]}) "
+            f"к «{phrases[-1].strength}» ({cards[-1]})."
+        )
+        return lines
+
+    @classmethod
+    def interpret(cls, question: str, situation: str, cards: List[str]) -> str:
+        """Расклад по шаблону; карты, которых нет в значениях, пропускаются"""
+        cards = [card for card in cards if card in cls._cards]
+        if not cards:
+            return ""
+        phrases = [cls._cards[card] for card in cards]
+
+        blocks = []
+        for i, (card, card_phrases) in enumerate(zip(cards, phrases)):
+            if len(cards) == 1:
+                nuance = f"В прямом положении: {card_phrases.upright}."
+            else:
+                # Соседняя карта: следующая, для последней — предыдущая
+                j = i + 1 if i + 1 < len(cards) else i - 1
+                nuance = cls._combination(card_phrases, cards[j], phrases[j])
+            blocks.append(
+                f"{i + 1}. ✨{card}✨:\n"
+                f"⭐️ {card_phrases.essence}\n"
+                f"⭐️ {nuance}\n"
+                f"⭐️ Ключ: {card_phrases.strength}. Теневая сторона: {card_phrases.risk}."
+            )
+
+        summary = cls._summary(question, cards, phrases)
+        advice = [
+            _sentence(f"Опорные точки: {', '.join(dict.fromkeys(p.strength for p in phrases))}"),
+            _sentence(f"Главное, чего стоит избегать — {phrases[0].caution}")
+        ]
+        return (
+            "\n\n".join(blocks)
+            + "\n\n✨Разбор ситуации:✨\n⭐️ " + " ".join(summary)
+            + "\n\n✨Совет:✨\n⭐️ " + " ".join(advice)
+        )
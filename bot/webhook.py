@@ -0,0 +1,91 @@
+import hmac
+import json
+import logging
+import secrets
+from typing import Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from config import Config
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """HTTP-сервер бота на Config.WEBHOOK_PORT.
+
+    /healthz и /metrics (текстовый формат Prometheus) доступны всегда. Если
+    задан WEBHOOK_URL, сервер принимает апдейты на /telegram/<secret>
+    (с проверкой заголовка секрета) и кладёт их прямо в
+    application.update_queue; иначе бот работает через polling.
+    """
+
+    def __init__(self, application: Application, secret: Optional[str] = None):
+        self.application = application
+        # Секрет без WEBHOOK_SECRET меняется при каждом запуске — вебхук переустанавливается в start()
+        self.secret = secret or Config.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/healthz", self.healthz)
+        self.app.router.add_get("/metrics", self.metrics)
+        if Config.WEBHOOK_URL:
+            self.app.router.add_post("/telegram/{secret}", self.telegram)
+
+    @property
+    def webhook_url(self) -> str:
+        return f"{Config.WEBHOOK_URL.rstrip('/')}/telegram/{self.secret}"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, Config.WEBHOOK_HOST, Config.WEBHOOK_PORT).start()
+        logger.info(f"HTTP server listening on {Config.WEBHOOK_HOST}:{Config.WEBHOOK_PORT}")
+        if Config.WEBHOOK_URL:
+            await self.application.bot.set_webhook(
+                url=self.webhook_url,
+                secret_token=self.secret,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=Config.CONCURRENT_UPDATES
+            )
+            logger.info("Webhook set")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        running = self.application.running
+        return web.json_response(
+            {"status": "ok" if running else "starting"},
+            status=200 if running else 503
+        )
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=REGISTRY.render(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    async def telegram(self, request: web.Request) -> web.Response:
+        header = request.headers.get(SECRET_HEADER, "")
+        expected = self.secret.encode()
+        if not (hmac.compare_digest(request.match_info["secret"].encode(), expected)
+                and hmac.compare_digest(header.encode(), expected)):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except json.JSONDecodeError:
+            return web.Response(status=400)
+        if not isinstance(data, dict):
+            # Валидный JSON, но не объект апдейта — de_json на нём падает с 500
+            return web.Response(status=400)
+        update = Update.de_json(data, self.application.bot)
+        await self.application.update_queue.put(update)
+        return web.Response()
@@ -12,10 +12,46 @@ class Config:
     ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
     GIGACHAT_AUTH_KEY = os.getenv("GIGACHAT_AUTH_KEY")
     GIGACHAT_SCOPE = os.getenv("GIGACHAT_SCOPE", "GIGACHAT_API_PERS")
+    GIGACHAT_POOL_LIMIT = int(os.getenv("GIGACHAT_POOL_LIMIT", "20"))
+    GIGACHAT_POOL_PER_HOST = int(os.getenv("GIGACHAT_POOL_PER_HOST", "10"))
+    GIGACHAT_DNS_TTL = int(os.getenv("GIGACHAT_DNS_TTL", "300"))
+    GIGACHAT_KEEPALIVE = float(os.getenv("GIGACHAT_KEEPALIVE", "30"))
+    INTERPRETATION_WORKERS = int(os.getenv("INTERPRETATION_WORKERS", "4"))
+    INTERPRETATION_QUEUE_LIMIT = int(os.getenv("INTERPRETATION_QUEUE_LIMIT", "20"))  # дальше — быстрый расклад
+    INTERPRETATION_TIMEOUT = float(os.getenv("INTERPRETATION_TIMEOUT", "30"))
+    GIGACHAT_STREAMING = os.getenv("GIGACHAT_STREAMING", "1") == "1"
+    GIGACHAT_STREAM_TIMEOUT = float(os.getenv("GIGACHAT_STREAM_TIMEOUT", "120"))
+    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
+    GIGACHAT_BREAKER_WINDOW = int(os.getenv("GIGACHAT_BREAKER_WINDOW", "20"))  # последних вызовов
+    GIGACHAT_BREAKER_MIN_CALLS = int(os.getenv("GIGACHAT_BREAKER_MIN_CALLS", "5"))
+    GIGACHAT_BREAKER_ERROR_RATE = float(os.getenv("GIGACHAT_BREAKER_ERROR_RATE", "0.5"))
+    GIGACHAT_BREAKER_COOLDOWN = float(os.getenv("GIGACHAT_BREAKER_COOLDOWN", "30"))
+    GIGACHAT_TIMEOUT_MIN = float(os.getenv("GIGACHAT_TIMEOUT_MIN", "8"))  # нижняя граница адаптивного таймаута
+    INTERPRETATION_CACHE_TTL = float(os.getenv("INTERPRETATION_CACHE_TTL", str(24 * 3600)))
+    INTERPRETATION_CACHE_SIZE = int(os.getenv("INTERPRETATION_CACHE_SIZE", "5000"))
+    INTERPRETATION_CACHE_MEMORY = int(os.getenv("INTERPRETATION_CACHE_MEMORY", "500"))
+    PREGENERATION_HOUR = int(os.getenv("PREGENERATION_HOUR", "22"))  # час UTC
+    PREGENERATION_CONCURRENCY = int(os.getenv("PREGENERATION_CONCURRENCY", "3"))
+    PERSISTENCE_INTERVAL = float(os.getenv("PERSISTENCE_INTERVAL", "5"))
+    PERSISTENCE_FLUSH_DELAY = float(os.getenv("PERSISTENCE_FLUSH_DELAY", "1"))
+    SLOW_UPDATE_SECONDS = float(os.getenv("SLOW_UPDATE_SECONDS", "2"))  # дольше — разбивка апдейта в лог
+    SLOW_JOB_SECONDS = float(os.getenv("SLOW_JOB_SECONDS", "30"))  # то же для задания очереди интерпретаций
+    PROFILE_SECONDS = int(os.getenv("PROFILE_SECONDS", "30"))  # /profile без аргумента
+    PROFILE_TOP = int(os.getenv("PROFILE_TOP", "40"))
+    CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # публичный адрес; без него — polling
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8000"))  # containerPort из amvera.yml
     SSL_CERT_PATH = BASE_DIR / "certs" / "russian_trusted_root_ca.cer"
     MEANINGS_PATH = BASE_DIR / "data" / "card_meanings.json"
     DB_PATH = BASE_DIR / "database" / "tarotbot.db"
+    DB_READERS = int(os.getenv("DB_READERS", "4"))
+    ENTITLEMENT_CACHE_TTL = float(os.getenv("ENTITLEMENT_CACHE_TTL", "60"))
+    ENTITLEMENT_CACHE_SIZE = int(os.getenv("ENTITLEMENT_CACHE_SIZE", "10000"))
     WELCOME_IMAGE_URL = "https://postimg.cc/SXqjBSWY"
+    BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))  # сообщений в секунду
+    BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
 
     @classmethod
     def validate(cls):
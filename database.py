@@ -1,20 +1,203 @@
 import aiosqlite
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from pathlib import Path
 from config import Config
+from metrics import DB_QUERY_SECONDS, DB_ERRORS
+from tracing import record_span
 import logging
-from typing import Optional
+from typing import Optional, Sequence, Tuple
 from datetime import datetime, timedelta, timezone
 
 logger = logging.getLogger(__name__)
 
+class _HelperCall:
+    """Идущий вызов хелпера БД; used — брал ли он соединение из пула"""
+    __slots__ = ("used",)
+
+    def __init__(self):
+        self.used = False
+
+
+_helper_call: ContextVar[Optional[_HelperCall]] = ContextVar("db_helper_call", default=None)
+
+
+def _timed(func):
+    """Время и ошибки хелпера — в метрики tarotbot_db_* с меткой helper и в трассу апдейта.
+
+    Замеряется только внешний хелпер (get_attempts → get_entitlement даёт один
+    замер) и только если он брал соединение: ответ из кэша — не запрос к БД.
+    """
+    helper = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _helper_call.get() is not None:
+            return await func(*args, **kwargs)
+        call = _HelperCall()
+        token = _helper_call.set(call)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            DB_ERRORS.inc(helper=helper)
+            raise
+        finally:
+            _helper_call.reset(token)
+            if call.used:
+                elapsed = time.perf_counter() - started
+                DB_QUERY_SECONDS.observe(elapsed, helper=helper)
+                record_span("db", helper, elapsed)
+    return wrapper
+
+
+def _mark_db_used():
+    call = _helper_call.get()
+    if call is not None:
+        call.used = True
+
 def _utcnow_str() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
+
+class ConnectionPool:
+    """Долгоживущие соединения SQLite: один писатель и несколько читателей (WAL)"""
+
+    def __init__(self, path, readers: int = 4):
+        self.path = path
+        self.readers_count = max(1, readers)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._all_readers: list = []
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path)
+        await conn.execute("PRAGMA busy_timeout = 5000")
+        return conn
+
+    async def open(self):
+        """Открывает писателя (включает WAL) и пул читателей"""
+        self._writer = await self._connect()
+        await self._writer.execute("PRAGMA journal_mode = WAL")
+        await self._writer.execute("PRAGMA synchronous = NORMAL")
+        for _ in range(self.readers_count):
+            conn = await self._connect()
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+        logger.info(f"DB pool opened: 1 writer, {self.readers_count} readers ({self.path})")
+
+    async def close(self):
+        """Закрывает все соединения пула"""
+        for conn in self._all_readers:
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.warning(f"Error closing reader connection: {e}")
+        self._all_readers.clear()
+        self._readers = asyncio.Queue()
+        if self._writer is not None:
+            async with self._write_lock:
+                await self._writer.close()
+            self._writer = None
+        logger.info("DB pool closed")
+
+    @asynccontextmanager
+    async def reader(self):
+        """Соединение только для чтения из пула"""
+        _mark_db_used()
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Единственное соединение на запись; коммит при успехе, откат при ошибке"""
+        _mark_db_used()
+        async with self._write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+
+class EntitlementCache:
+    """LRU-кэш с TTL: попытки и дата окончания подписки по пользователю"""
+
+    def __init__(self, ttl: float = 60, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        # Растёт при каждой записи — не даём чтению, начатому до записи, положить устаревшие данные
+        self.version = 0
+
+    def get(self, user_id: int) -> Optional[tuple]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        attempts, sub_end, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return attempts, sub_end
+
+    def put(self, user_id: int, attempts: int, sub_end: Optional[str], version: Optional[int] = None):
+        if version is not None and version != self.version:
+            return
+        self._entries[user_id] = (attempts, sub_end, time.monotonic())
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def set_attempts(self, user_id: int, attempts: int):
+        """Обновляет попытки в существующей записи после списания/начисления"""
+        self.version += 1
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries[user_id] = (attempts, entry[1], entry[2])
+
+    def invalidate(self, user_id: int):
+        self.version += 1
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self.version += 1
+        self._entries.clear()
+
+
+entitlements = EntitlementCache(ttl=Config.ENTITLEMENT_CACHE_TTL, max_size=Config.ENTITLEMENT_CACHE_SIZE)
+
+_pool: Optional[ConnectionPool] = None
+
+def get_pool() -> ConnectionPool:
+    if _pool is None:
+        raise RuntimeError("Database pool is not initialized, call init_db() first")
+    return _pool
+
+def _is_read_query(query: str) -> bool:
+    head = query.lstrip().upper()
+    return head.startswith(("SELECT", "WITH")) and "RETURNING" not in head
+
 async def init_db():
-    """Инициализация базы данных"""
+    """Инициализация базы данных и пула соединений"""
+    global _pool
     Path(Config.DB_PATH.parent).mkdir(exist_ok=True)
-    
-    async with aiosqlite.connect(Config.DB_PATH) as conn:
+
+    if _pool is None:
+        pool = ConnectionPool(Config.DB_PATH, readers=Config.DB_READERS)
+        await pool.open()
+        _pool = pool
+
+    async with _pool.writer() as conn:
         await conn.executescript('''
         CREATE TABLE IF NOT EXISTS users (
             telegram_id INTEGER PRIMARY KEY NOT NULL,
@@ -49,44 +232,170 @@ async def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY(user_id) REFERENCES users(telegram_id)
         );
+
+        CREATE TABLE IF NOT EXISTS media_cache (
+            file_hash TEXT PRIMARY KEY NOT NULL,
+            file_id TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT,
+            photo TEXT,
+            status TEXT NOT NULL DEFAULT 'running',
+            status_chat_id INTEGER,
+            status_message_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            broadcast_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (broadcast_id, user_id),
+            FOREIGN KEY(broadcast_id) REFERENCES broadcasts(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS prepared_readings (
+            period TEXT NOT NULL,
+            period_key TEXT NOT NULL,
+            card TEXT NOT NULL,
+            interpretation TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (period, period_key, card)
+        );
+
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day TEXT PRIMARY KEY NOT NULL,
+            new_users INTEGER NOT NULL DEFAULT 0,
+            readings INTEGER NOT NULL DEFAULT 0,
+            subscriptions INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS stat_totals (
+            name TEXT PRIMARY KEY NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS persistence (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data BLOB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (kind, key)
+        );
+
+        CREATE TABLE IF NOT EXISTS interpretation_cache (
+            cache_key TEXT PRIMARY KEY NOT NULL,
+            interpretation TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
         ''')
         try:
             cur = await conn.execute("PRAGMA table_info(users)")
             cols = [row[1] for row in await cur.fetchall()]
             if "referrer_id" not in cols:
                 await conn.execute("ALTER TABLE users ADD COLUMN referrer_id INTEGER")
-                await conn.commit()
         except Exception as e:
             logger.warning(f"Schema check/migration failed: {e}")
         
         # Индексы для ускорения поиска активных подписок
         await conn.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_user_end ON subscriptions(user_id, end_date)")
-        await conn.commit()
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_interpretation_cache_used ON interpretation_cache(last_used)")
+        # Индексы для окон аналитики
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_readings_created ON readings(created_at)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_end ON subscriptions(end_date)")
+        # Индексы для списка пользователей в админке
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at, telegram_id)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username COLLATE NOCASE)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_attempts_user ON attempts(user_id)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_readings_user ON readings(user_id, created_at)")
+
+        # Первый запуск со сводкой: заполняем её по уже накопленной истории
+        cur = await conn.execute("SELECT 1 FROM daily_stats LIMIT 1")
+        if await cur.fetchone() is None:
+            for column, source in _DAILY_STATS_BACKFILL.items():
+                await conn.execute(
+                    f"INSERT INTO daily_stats (day, {column}) {source} "
+                    f"ON CONFLICT(day) DO UPDATE SET {column} = excluded.{column}"
+                )
 
+        # Сумма оставшихся попыток для аналитики: считается один раз, дальше её ведут триггеры
+        # в той же транзакции, что и любое изменение attempts
+        await conn.execute(
+            "INSERT OR IGNORE INTO stat_totals (name, value) "
+            "SELECT 'attempts', COALESCE(SUM(remaining), 0) FROM attempts"
+        )
+        await conn.executescript('''
+        CREATE TRIGGER IF NOT EXISTS attempts_total_insert AFTER INSERT ON attempts BEGIN
+            UPDATE stat_totals SET value = value + NEW.remaining WHERE name = 'attempts';
+        END;
+        CREATE TRIGGER IF NOT EXISTS attempts_total_update AFTER UPDATE OF remaining ON attempts BEGIN
+            UPDATE stat_totals SET value = value + NEW.remaining - OLD.remaining WHERE name = 'attempts';
+        END;
+        CREATE TRIGGER IF NOT EXISTS attempts_total_delete AFTER DELETE ON attempts BEGIN
+            UPDATE stat_totals SET value = value - OLD.remaining WHERE name = 'attempts';
+        END;
+        ''')
+
+_DAILY_STATS_BACKFILL = {
+    "new_users": "SELECT date(created_at), COUNT(*) FROM users WHERE created_at IS NOT NULL GROUP BY 1",
+    "readings": "SELECT date(created_at), COUNT(*) FROM readings WHERE created_at IS NOT NULL GROUP BY 1",
+    "subscriptions": "SELECT date(start_date), COUNT(*) FROM subscriptions WHERE start_date IS NOT NULL GROUP BY 1",
+}
+
+async def _bump_daily_stat(conn, column: str):
+    """+1 к счётчику сегодняшнего дня (UTC) в той же транзакции, что и сама запись"""
+    await conn.execute(
+        f"INSERT INTO daily_stats (day, {column}) VALUES (date('now'), 1) "
+        f"ON CONFLICT(day) DO UPDATE SET {column} = {column} + 1"
+    )
+
+async def close_db():
+    """Закрытие пула соединений при остановке бота"""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+@_timed
 async def execute_query(query: str, params: tuple = (), fetch_one: bool = False):
     """Универсальная функция для выполнения запросов"""
     try:
-        async with aiosqlite.connect(Config.DB_PATH) as conn:
+        pool = get_pool()
+        if _is_read_query(query):
+            async with pool.reader() as conn:
+                cursor = await conn.execute(query, params)
+                return await cursor.fetchone() if fetch_one else await cursor.fetchall()
+        async with pool.writer() as conn:
             cursor = await conn.execute(query, params)
-            await conn.commit()
             return await cursor.fetchone() if fetch_one else await cursor.fetchall()
     except Exception as e:
         logger.error(f"Database error: {e}")
         raise
 
+@_timed
 async def add_user(telegram_id: int, username: str = None, referrer_id: Optional[int] = None, context=None):
     user = await get_user(telegram_id)
     if not user:
         # Первый вход — добавляем
-        await execute_query(
-            "INSERT INTO users (telegram_id, username, referrer_id) VALUES (?, ?, ?)",
-            (telegram_id, username, referrer_id)
-        )
+        async with get_pool().writer() as conn:
+            await conn.execute(
+                "INSERT INTO users (telegram_id, username, referrer_id) VALUES (?, ?, ?)",
+                (telegram_id, username, referrer_id)
+            )
+            await _bump_daily_stat(conn, "new_users")
         # Новый пользователь по умолчанию получает 5 попыток
         await execute_query(
             "INSERT OR IGNORE INTO attempts (user_id, remaining) VALUES (?, ?)",
             (telegram_id, 5)
         )
+        entitlements.invalidate(telegram_id)
         # Если есть реферал и не сам себе, начисляем по 1 бонусу обоим
         if referrer_id and referrer_id != telegram_id:
             await update_attempts(referrer_id, 1)
@@ -115,6 +424,7 @@ async def add_user(telegram_id: int, username: str = None, referrer_id: Optional
             (username, telegram_id)
         )
 
+@_timed
 async def get_user(telegram_id: int):
     """Получение информации о пользователе"""
     return await execute_query(
@@ -123,24 +433,121 @@ async def get_user(telegram_id: int):
         fetch_one=True
     )
 
+@_timed
+async def get_users_page(cursor_id: Optional[int] = None, backward: bool = False,
+                         limit: int = 10, prefix: Optional[str] = None) -> tuple:
+    """Страница пользователей от новых к старым с keyset-пагинацией по (created_at, telegram_id).
+
+    cursor_id — граничный пользователь предыдущей страницы: вперёд берутся
+    более старые, назад (backward) — более новые. Возвращает (строки, есть ли
+    ещё в этом направлении); строки — (telegram_id, username, created_at,
+    попытки, активна ли подписка) в порядке от новых к старым.
+    """
+    conditions, params = [], []
+    if prefix:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append("u.username LIKE ? ESCAPE '\\'")
+        params.append(f"{escaped}%")
+    if cursor_id is not None:
+        op = ">" if backward else "<"
+        conditions.append(
+            f"(u.created_at, u.telegram_id) {op} "
+            f"(SELECT created_at, telegram_id FROM users WHERE telegram_id = ?)"
+        )
+        params.append(cursor_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = "ASC" if backward else "DESC"
+    rows = await execute_query(
+        f"""
+        SELECT
+            u.telegram_id,
+            u.username,
+            u.created_at,
+            COALESCE((SELECT remaining FROM attempts a WHERE a.user_id = u.telegram_id LIMIT 1), 0),
+            EXISTS (SELECT 1 FROM subscriptions s WHERE s.user_id = u.telegram_id AND s.end_date > datetime('now'))
+        FROM users u
+        {where}
+        ORDER BY u.created_at {order}, u.telegram_id {order}
+        LIMIT ?
+        """,
+        (*params, limit + 1)
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+    return rows, has_more
+
+@_timed
+async def get_user_details(telegram_id: int) -> Optional[dict]:
+    """Карточка пользователя для админки"""
+    row = await execute_query(
+        """
+        SELECT
+            u.telegram_id,
+            u.username,
+            u.created_at,
+            u.referrer_id,
+            COALESCE((SELECT remaining FROM attempts WHERE user_id = u.telegram_id LIMIT 1), 0),
+            (SELECT MAX(end_date) FROM subscriptions WHERE user_id = u.telegram_id AND end_date > datetime('now')),
+            (SELECT COUNT(*) FROM readings WHERE user_id = u.telegram_id),
+            (SELECT MAX(created_at) FROM readings WHERE user_id = u.telegram_id)
+        FROM users u
+        WHERE u.telegram_id = ?
+        """,
+        (telegram_id,),
+        fetch_one=True
+    )
+    if not row:
+        return None
+    keys = ("telegram_id", "username", "created_at", "referrer_id", "attempts", "sub_end", "readings", "last_reading")
+    return dict(zip(keys, row))
+
+@_timed
+async def get_entitlement(telegram_id: int) -> tuple:
+    """Попытки и наличие активной подписки (из кэша, иначе одним запросом)"""
+    cached = entitlements.get(telegram_id)
+    if cached is None:
+        version = entitlements.version
+        try:
+            async with get_pool().reader() as conn:
+                cursor = await conn.execute(
+                    """
+                    SELECT
+                        (SELECT remaining FROM attempts WHERE user_id = ?),
+                        (SELECT MAX(end_date) FROM subscriptions WHERE user_id = ? AND end_date > datetime('now'))
+                    """,
+                    (telegram_id, telegram_id)
+                )
+                remaining, sub_end = await cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error getting entitlement for {telegram_id}: {e}")
+            return None, False
+        cached = (remaining or 0, sub_end)
+        entitlements.put(telegram_id, *cached, version=version)
+
+    attempts, sub_end = cached
+    # Подписка могла истечь, пока запись лежит в кэше
+    has_sub = bool(sub_end) and str(sub_end) > _utcnow_str()
+    return attempts, has_sub
+
+@_timed
 async def get_attempts(telegram_id: int):
     """Получение попыток с обработкой ошибок"""
-    try:
-        async with aiosqlite.connect(Config.DB_PATH) as conn:
-            cursor = await conn.execute(
-                "SELECT remaining FROM attempts WHERE user_id = ?",
-                (telegram_id,)
-            )
-            result = await cursor.fetchone()
-            return result[0] if result else 0
-    except Exception as e:
-        logger.error(f"Error getting attempts for {telegram_id}: {e}")
-        return None
+    attempts, _ = await get_entitlement(telegram_id)
+    return attempts
+
+@_timed
+async def has_active_subscription(telegram_id: int) -> bool:
+    """Есть ли у пользователя активная подписка"""
+    _, has_sub = await get_entitlement(telegram_id)
+    return has_sub
 
+@_timed
 async def get_active_subscription(telegram_id: int):
     """Получение подписки с обработкой ошибок"""
     try:
-        async with aiosqlite.connect(Config.DB_PATH) as conn:
+        async with get_pool().reader() as conn:
             cursor = await conn.execute(
                 "SELECT * FROM subscriptions WHERE user_id = ? AND end_date > datetime('now')",
                 (telegram_id,)
@@ -150,9 +557,10 @@ async def get_active_subscription(telegram_id: int):
         logger.error(f"Error getting subscription for {telegram_id}: {e}")
         return None
 
+@_timed
 async def update_attempts(telegram_id: int, change: int):
     """Обновление количества попыток с защитой от отрицательных значений при подписке"""
-    async with aiosqlite.connect(Config.DB_PATH) as conn:
+    async with get_pool().writer() as conn:
         # Проверяем есть ли активная подписка
         has_sub = await conn.execute(
             "SELECT 1 FROM subscriptions WHERE user_id = ? AND end_date > datetime('now')",
@@ -162,33 +570,69 @@ async def update_attempts(telegram_id: int, change: int):
 
         if has_sub and change < 0:
             # Если есть подписка, не даем уйти в минус
-            await conn.execute(
-                "UPDATE attempts SET remaining = MAX(remaining + ?, 0) WHERE user_id = ?",
+            cursor = await conn.execute(
+                "UPDATE attempts SET remaining = MAX(remaining + ?, 0) WHERE user_id = ? RETURNING remaining",
                 (change, telegram_id)
             )
         else:
             # Иначе обычное обновление
-            await conn.execute(
-                "UPDATE attempts SET remaining = remaining + ? WHERE user_id = ?",
+            cursor = await conn.execute(
+                "UPDATE attempts SET remaining = remaining + ? WHERE user_id = ? RETURNING remaining",
                 (change, telegram_id)
             )
-        await conn.commit()
+        row = await cursor.fetchone()
+    if row is not None:
+        entitlements.set_attempts(telegram_id, row[0])
+    else:
+        entitlements.invalidate(telegram_id)
 
+@_timed
+async def consume_attempt(telegram_id: int) -> Optional[Tuple[int, bool]]:
+    """Атомарно проверяет доступ и списывает попытку.
 
+    Возвращает (новый остаток, списана ли попытка) или None, если доступа нет.
+    Пока попытки есть, списывается одна; с активной подпиской доступ есть и
+    при нуле — тогда charged=False и при ошибке возвращать нечего.
+    """
+    async with get_pool().writer() as conn:
+        cursor = await conn.execute(
+            "UPDATE attempts SET remaining = remaining - 1 "
+            "WHERE user_id = ? AND remaining > 0 RETURNING remaining",
+            (telegram_id,)
+        )
+        row = await cursor.fetchone()
+        if row is None:
+            # Нет попыток (или строки attempts) — пускаем только по подписке
+            cursor = await conn.execute(
+                "SELECT 1 FROM subscriptions WHERE user_id = ? AND end_date > datetime('now')",
+                (telegram_id,)
+            )
+            result = (0, False) if await cursor.fetchone() else None
+        else:
+            result = (row[0], True)
+    if row is not None:
+        entitlements.set_attempts(telegram_id, row[0])
+    return result
+
+@_timed
 async def add_subscription(telegram_id: int, sub_type: str, duration_days: int):
     """Добавление подписки (UTC-таймстемпы)"""
     start_dt = datetime.now(timezone.utc)
     end_dt = start_dt + timedelta(days=duration_days)
     start = start_dt.strftime("%Y-%m-%d %H:%M:%S")
     end = end_dt.strftime("%Y-%m-%d %H:%M:%S")
-    await execute_query(
-        "INSERT INTO subscriptions (user_id, type, start_date, end_date) VALUES (?, ?, ?, ?)",
-        (telegram_id, sub_type, start, end)
-    )
+    async with get_pool().writer() as conn:
+        await conn.execute(
+            "INSERT INTO subscriptions (user_id, type, start_date, end_date) VALUES (?, ?, ?, ?)",
+            (telegram_id, sub_type, start, end)
+        )
+        await _bump_daily_stat(conn, "subscriptions")
+    entitlements.invalidate(telegram_id)
 
+@_timed
 async def cancel_subscription(user_id: int) -> int:
     """Аннулировать активные подписки пользователя, вернуть число отменённых"""
-    async with aiosqlite.connect(Config.DB_PATH) as conn:
+    async with get_pool().writer() as conn:
         cursor = await conn.execute(
             """
             UPDATE subscriptions
@@ -198,13 +642,221 @@ async def cancel_subscription(user_id: int) -> int:
             """,
             (user_id,)
         )
-        await conn.commit()
-        return cursor.rowcount
+        changed = cursor.rowcount
+    entitlements.invalidate(user_id)
+    return changed
 
+@_timed
 async def save_reading(telegram_id: int, question: str, situation: str, cards: list, interpretation: str):
     """Сохранение расклада"""
+    async with get_pool().writer() as conn:
+        await conn.execute(
+            "INSERT INTO readings (user_id, question, situation, cards, interpretation) VALUES (?, ?, ?, ?, ?)",
+            (telegram_id, question, situation, ",".join(cards), interpretation)
+        )
+        await _bump_daily_stat(conn, "readings")
+
+@_timed
+async def get_dashboard_stats() -> dict:
+    """Сводка для админ-аналитики: итоги из daily_stats, окна — по индексам"""
+    row = await execute_query("""
+        SELECT
+            (SELECT COALESCE(SUM(new_users), 0) FROM daily_stats),
+            (SELECT COALESCE(SUM(readings), 0) FROM daily_stats),
+            (SELECT COUNT(*) FROM subscriptions WHERE end_date > datetime('now')),
+            (SELECT value FROM stat_totals WHERE name = 'attempts'),
+            (SELECT COUNT(*) FROM readings WHERE created_at >= datetime('now', '-1 day')),
+            (SELECT COUNT(*) FROM readings WHERE created_at >= datetime('now', '-7 day'))
+    """, fetch_one=True)
+    keys = ("total_users", "total_readings", "active_subs", "total_attempts", "readings_day", "readings_week")
+    return dict(zip(keys, row))
+
+@_timed
+async def get_daily_stats(days: int = 30) -> list:
+    """Строки (day, new_users, readings, subscriptions) за последние days дней, по возрастанию"""
+    return await execute_query(
+        "SELECT day, new_users, readings, subscriptions FROM daily_stats "
+        "WHERE day >= date('now', ?) ORDER BY day",
+        (f"-{days - 1} day",)
+    )
+
+@_timed
+async def get_media_file_id(file_hash: str) -> Optional[str]:
+    """Telegram file_id ранее загруженного файла"""
+    row = await execute_query(
+        "SELECT file_id FROM media_cache WHERE file_hash = ?",
+        (file_hash,),
+        fetch_one=True
+    )
+    return row[0] if row else None
+
+@_timed
+async def save_media_file_id(file_hash: str, file_id: str):
+    """Сохранение file_id загруженного файла"""
+    await execute_query(
+        "INSERT OR REPLACE INTO media_cache (file_hash, file_id, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+        (file_hash, file_id)
+    )
+
+@_timed
+async def delete_media_file_id(file_hash: str):
+    """Удаление file_id, который Telegram больше не принимает"""
+    await execute_query("DELETE FROM media_cache WHERE file_hash = ?", (file_hash,))
+
+@_timed
+async def get_prepared_reading(period: str, period_key: str, card: str) -> Optional[str]:
+    """Заранее сгенерированная интерпретация карты дня/недели"""
+    row = await execute_query(
+        "SELECT interpretation FROM prepared_readings WHERE period = ? AND period_key = ? AND card = ?",
+        (period, period_key, card),
+        fetch_one=True
+    )
+    return row[0] if row else None
+
+@_timed
+async def get_prepared_cards(period: str, period_key: str) -> set:
+    """Карты, для которых интерпретация на период уже готова"""
+    rows = await execute_query(
+        "SELECT card FROM prepared_readings WHERE period = ? AND period_key = ?",
+        (period, period_key)
+    )
+    return {row[0] for row in rows}
+
+@_timed
+async def save_prepared_reading(period: str, period_key: str, card: str, interpretation: str):
+    """Сохранение заранее сгенерированной интерпретации"""
     await execute_query(
-        "INSERT INTO readings (user_id, question, situation, cards, interpretation) VALUES (?, ?, ?, ?, ?)",
-        (telegram_id, question, situation, ",".join(cards), interpretation)
+        "INSERT OR REPLACE INTO prepared_readings (period, period_key, card, interpretation) VALUES (?, ?, ?, ?)",
+        (period, period_key, card, interpretation)
     )
 
+@_timed
+async def delete_old_prepared_readings(days: int = 14):
+    """Удаление заготовок за прошедшие периоды"""
+    await execute_query(
+        "DELETE FROM prepared_readings WHERE created_at < datetime('now', ?)",
+        (f"-{days} days",)
+    )
+
+@_timed
+async def load_persistence(kind: str) -> list:
+    """Строки (key, data) сохранённого состояния бота указанного вида"""
+    return await execute_query("SELECT key, data FROM persistence WHERE kind = ?", (kind,))
+
+@_timed
+async def write_persistence(upserts: list, deletes: list):
+    """Пакетная запись состояния бота одной транзакцией: upserts — (kind, key, data), deletes — (kind, key)"""
+    async with get_pool().writer() as conn:
+        if upserts:
+            await conn.executemany(
+                "INSERT OR REPLACE INTO persistence (kind, key, data, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+                upserts
+            )
+        if deletes:
+            await conn.executemany("DELETE FROM persistence WHERE kind = ? AND key = ?", deletes)
+
+@_timed
+async def get_cached_interpretation(cache_key: str, min_created_at: float) -> Optional[tuple]:
+    """(интерпретация, created_at) из кэша, если запись не старше min_created_at.
+
+    Читает через пул читателей; last_used обновляется пачкой при следующем
+    save_cached_interpretation (touched), а не на каждом попадании.
+    """
+    async with get_pool().reader() as conn:
+        cursor = await conn.execute(
+            "SELECT interpretation, created_at FROM interpretation_cache "
+            "WHERE cache_key = ? AND created_at >= ?",
+            (cache_key, min_created_at)
+        )
+        row = await cursor.fetchone()
+        return tuple(row) if row else None
+
+@_timed
+async def save_cached_interpretation(cache_key: str, interpretation: str, created_at: float,
+                                     max_entries: int, min_created_at: float,
+                                     touched: Sequence[Tuple[float, str]] = ()):
+    """Сохранение интерпретации в кэш с удалением устаревших и давно не использованных записей.
+
+    touched — накопленные попадания (last_used, cache_key): записываются до
+    вытеснения, которому только и нужен last_used.
+    """
+    async with get_pool().writer() as conn:
+        if touched:
+            await conn.executemany(
+                "UPDATE interpretation_cache SET last_used = ? WHERE cache_key = ?", touched
+            )
+        await conn.execute(
+            "INSERT OR REPLACE INTO interpretation_cache (cache_key, interpretation, created_at, last_used) "
+            "VALUES (?, ?, ?, ?)",
+            (cache_key, interpretation, created_at, created_at)
+        )
+        await conn.execute("DELETE FROM interpretation_cache WHERE created_at < ?", (min_created_at,))
+        await conn.execute(
+            "DELETE FROM interpretation_cache WHERE cache_key IN ("
+            "SELECT cache_key FROM interpretation_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (max_entries,)
+        )
+
+@_timed
+async def create_broadcast(text: str, photo: Optional[str]) -> int:
+    """Создание рассылки со снимком списка получателей"""
+    async with get_pool().writer() as conn:
+        cursor = await conn.execute(
+            "INSERT INTO broadcasts (text, photo) VALUES (?, ?)",
+            (text, photo)
+        )
+        broadcast_id = cursor.lastrowid
+        await conn.execute(
+            "INSERT INTO broadcast_deliveries (broadcast_id, user_id) SELECT ?, telegram_id FROM users",
+            (broadcast_id,)
+        )
+        return broadcast_id
+
+@_timed
+async def set_broadcast_status_message(broadcast_id: int, chat_id: int, message_id: int):
+    """Запоминает сообщение, в котором показывается прогресс рассылки"""
+    await execute_query(
+        "UPDATE broadcasts SET status_chat_id = ?, status_message_id = ? WHERE id = ?",
+        (chat_id, message_id, broadcast_id)
+    )
+
+@_timed
+async def get_unfinished_broadcasts():
+    """Рассылки, прерванные остановкой бота"""
+    return await execute_query(
+        "SELECT id, text, photo, status_chat_id, status_message_id FROM broadcasts WHERE status = 'running'"
+    )
+
+@_timed
+async def get_pending_deliveries(broadcast_id: int) -> list:
+    """Получатели, которым сообщение ещё не доставлено"""
+    rows = await execute_query(
+        "SELECT user_id FROM broadcast_deliveries WHERE broadcast_id = ? AND status = 'pending'",
+        (broadcast_id,)
+    )
+    return [row[0] for row in rows]
+
+@_timed
+async def mark_delivery(broadcast_id: int, user_id: int, status: str, error: Optional[str] = None):
+    """Фиксирует результат доставки одному получателю"""
+    await execute_query(
+        "UPDATE broadcast_deliveries SET status = ?, error = ?, updated_at = ? WHERE broadcast_id = ? AND user_id = ?",
+        (status, error, _utcnow_str(), broadcast_id, user_id)
+    )
+
+@_timed
+async def get_broadcast_progress(broadcast_id: int) -> dict:
+    """Количество получателей рассылки по статусам"""
+    rows = await execute_query(
+        "SELECT status, COUNT(*) FROM broadcast_deliveries WHERE broadcast_id = ? GROUP BY status",
+        (broadcast_id,)
+    )
+    return {status: count for status, count in rows}
+
+@_timed
+async def finish_broadcast(broadcast_id: int):
+    """Помечает рассылку завершённой"""
+    await execute_query(
+        "UPDATE broadcasts SET status = 'done', finished_at = ? WHERE id = ?",
+        (_utcnow_str(), broadcast_id)
+    )
@@ -0,0 +1,188 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса и их выгрузка в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+
+    def register(self, metric: "_Metric"):
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: MetricsRegistry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _ValueMetric(_Metric):
+    """Счётчик или gauge: значение на набор меток либо функция, вызываемая при выгрузке"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: MetricsRegistry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set_function(self, function: Callable[[], Dict[LabelValues, float]]):
+        """Значения считаются при каждой выгрузке: {кортеж значений меток: число}"""
+        self._function = function
+
+    def render(self) -> List[str]:
+        values = self._function() if self._function is not None else self._values
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Counter(_ValueMetric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_ValueMetric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: MetricsRegistry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счётчики по корзинам (последняя — +Inf), сумма]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Замер блока кода (годится и внутри async-функций)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += counts[-1]
+            bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+# --- Метрики бота ---
+
+HANDLER_SECONDS = Histogram(
+    "tarotbot_handler_seconds", "Время работы обработчика апдейта", ("handler",)
+)
+HANDLER_ERRORS = Counter(
+    "tarotbot_handler_errors_total", "Исключения в обработчиках апдейтов", ("handler",)
+)
+DB_QUERY_SECONDS = Histogram(
+    "tarotbot_db_query_seconds", "Время выполнения хелпера БД", ("helper",)
+)
+DB_ERRORS = Counter(
+    "tarotbot_db_errors_total", "Ошибки хелперов БД", ("helper",)
+)
+GIGACHAT_SECONDS = Histogram(
+    "tarotbot_gigachat_request_seconds",
+    "Запросы к GigaChat по типу (auth, completion, stream) и статусу (HTTP-код, timeout, error)",
+    ("call", "status")
+)
+GIGACHAT_REJECTED = Counter(
+    "tarotbot_gigachat_rejected_total", "Вызовы GigaChat, отклонённые открытым автоматом"
+)
+GIGACHAT_CIRCUIT_STATE = Gauge(
+    "tarotbot_gigachat_circuit_state", "Текущее состояние автомата GigaChat (1 — активное)", ("state",)
+)
+GIGACHAT_COALESCED = Counter(
+    "tarotbot_gigachat_coalesced_total",
+    "Вызовы generate_interpretation: hit — присоединился к идущему запросу, miss — начал новый",
+    ("result",)
+)
+TELEGRAM_API_SECONDS = Histogram(
+    "tarotbot_telegram_api_seconds", "Вызовы Bot API по методу и HTTP-статусу", ("method", "status")
+)
+BROADCAST_RETRY_AFTER = Counter(
+    "tarotbot_broadcast_retry_after_total", "Ответы RetryAfter (flood wait) во время рассылок"
+)
+INTERPRETATION_QUEUE = Gauge(
+    "tarotbot_interpretation_queue", "Очередь интерпретаций: ожидают (waiting) и в работе (running)", ("status",)
+)
+CONVERSATION_STATES = Gauge(
+    "tarotbot_conversation_states", "Сколько чатов сейчас в каждом состоянии диалога", ("conversation", "state")
+)
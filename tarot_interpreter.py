@@ -1,17 +1,355 @@
 import aiohttp
+import asyncio
+import time
 import uuid
 import logging
 import ssl
 import json
+import hashlib
+from collections import deque
 from pathlib import Path
 from config import Config
-from typing import Optional, Dict, Any
+from metrics import (
+    GIGACHAT_SECONDS, GIGACHAT_REJECTED, GIGACHAT_CIRCUIT_STATE, GIGACHAT_COALESCED
+)
+from tracing import record_span
+from typing import Optional, Dict, Any, AsyncIterator
 
 
 logger = logging.getLogger(__name__)
 
+GIGACHAT_AUTH_URL = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
+GIGACHAT_COMPLETIONS_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+
+# Меняйте при любой правке build_prompt/build_payload — от неё зависят ключи кэша интерпретаций
+PROMPT_VERSION = 1
+
+ERROR_NO_TOKEN = "Не удалось получить токен для доступа к GigaChat."
+ERROR_API = "Ошибка при генерации интерпретации"
+ERROR_TIMEOUT = "Время генерации истекло, попробуйте позже"
+ERROR_CONNECTION = "Ошибка подключения к серверу"
+ERROR_UNAVAILABLE = "Сервис интерпретаций временно недоступен, попробуйте позже"
+ERROR_MESSAGES = frozenset({ERROR_NO_TOKEN, ERROR_API, ERROR_TIMEOUT, ERROR_CONNECTION, ERROR_UNAVAILABLE})
+
+
+class GigaChatError(Exception):
+    """Ошибка обращения к GigaChat (для потокового режима)"""
+
+
+class CircuitBreaker:
+    """Автомат closed → open → half-open по доле ошибок среди последних вызовов GigaChat.
+
+    closed: вызовы проходят, исходы копятся в окне из window последних; если
+    ошибок не меньше error_rate (при хотя бы min_calls исходах) — open.
+    open: вызовы отклоняются сразу в течение cooldown секунд. half-open:
+    пропускается один пробный вызов; успех закрывает автомат, ошибка
+    открывает снова.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window: int = 20, min_calls: int = 5,
+                 error_rate: float = 0.5, cooldown: float = 30):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self._failures: deque = deque(maxlen=window)  # True — ошибка, False — успех
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_inflight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._probe_inflight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Можно ли выполнить вызов; в half-open занимает единственный пробный слот"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_inflight:
+            self._probe_inflight = True
+            return True
+        return False
+
+    def record(self, healthy: Optional[bool]):
+        """Исход вызова: True — успех, False — ошибка сервиса, None — без вердикта (отмена)"""
+        if healthy is None:
+            self._probe_inflight = False
+        elif healthy:
+            if self._state == self.HALF_OPEN:
+                logger.info("GigaChat circuit closed")
+                self._state = self.CLOSED
+                self._probe_inflight = False
+                self._failures.clear()
+            self._failures.append(False)
+        elif self._state == self.HALF_OPEN:
+            self._open()
+        else:
+            self._failures.append(True)
+            if (self._state == self.CLOSED and len(self._failures) >= self.min_calls
+                    and sum(self._failures) >= self.error_rate * len(self._failures)):
+                self._open()
+
+    def _open(self):
+        logger.warning(f"GigaChat circuit opened for {self.cooldown:.0f}s")
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_inflight = False
+        self._failures.clear()
+
+
+class AdaptiveTimeout:
+    """Таймаут по p95 недавних задержек, отдельно для каждого размера расклада.
+
+    Пока замеров меньше min_samples, действует maximum. Таймаут считается
+    замером в maximum: если их больше 5%, p95 упирается в maximum, и
+    слишком жёсткий таймаут не «залипает».
+    """
+
+    def __init__(self, minimum: float, maximum: float, factor: float = 1.5,
+                 samples: int = 50, min_samples: int = 10):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.samples = samples
+        self.min_samples = min_samples
+        self._latencies: Dict[int, deque] = {}
+
+    def observe(self, size: int, seconds: float):
+        if size not in self._latencies:
+            self._latencies[size] = deque(maxlen=self.samples)
+        self._latencies[size].append(seconds)
+
+    def observe_timeout(self, size: int):
+        self.observe(size, self.maximum)
+
+    def get(self, size: int) -> float:
+        latencies = self._latencies.get(size)
+        if not latencies or len(latencies) < self.min_samples:
+            return self.maximum
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return min(self.maximum, max(self.minimum, p95 * self.factor))
+
+
+class _Flight:
+    """Один вызов GigaChat и число тех, кто ждёт его результат"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class GigaChatClient:
+    """Общая keep-alive сессия aiohttp с заранее загруженным SSL-контекстом"""
+
+    def __init__(self, limit: int = 20, limit_per_host: int = 10,
+                 dns_ttl: int = 300, keepalive_timeout: float = 30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.ssl_context = ssl.create_default_context(cafile=str(Config.SSL_CERT_PATH))
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Сессия создаётся при первом обращении и переиспользуется дальше"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                use_dns_cache=True,
+                keepalive_timeout=self.keepalive_timeout,
+                ssl=self.ssl_context
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class GigaChatTokenManager:
+    """Кэш OAuth-токена GigaChat с фоновым обновлением до истечения срока"""
+
+    DEFAULT_TTL = 30 * 60  # токен GigaChat живёт ~30 минут
+
+    def __init__(self, client: GigaChatClient, refresh_margin: int = 120):
+        self.client = client
+        self.refresh_margin = refresh_margin
+        self._token: Optional[str] = None
+        self._expires_at: float = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresh_timer: Optional[asyncio.Task] = None
+
+    @property
+    def is_valid(self) -> bool:
+        return bool(self._token) and time.time() < self._expires_at - self.refresh_margin / 4
+
+    async def get_token(self) -> Optional[str]:
+        """Возвращает действующий токен, при необходимости дожидаясь обновления"""
+        if self.is_valid:
+            return self._token
+        return await self.refresh()
+
+    async def refresh(self) -> Optional[str]:
+        """Обновляет токен; параллельные вызовы ждут один общий запрос"""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._do_refresh())
+        return await asyncio.shield(self._inflight)
+
+    def invalidate(self):
+        """Сбрасывает токен (например, после ответа 401)"""
+        self._token = None
+        self._expires_at = 0.0
+
+    async def close(self):
+        for task in (self._refresh_timer, self._inflight):
+            if task and not task.done():
+                task.cancel()
+        self._refresh_timer = None
+        self._inflight = None
+
+    async def _do_refresh(self) -> Optional[str]:
+        result = await self._fetch()
+        if not result:
+            return None
+        self._token, self._expires_at = result
+        self._schedule_refresh()
+        return self._token
+
+    def _schedule_refresh(self):
+        if self._refresh_timer and not self._refresh_timer.done():
+            self._refresh_timer.cancel()
+        delay = max(self._expires_at - time.time() - self.refresh_margin, 1)
+        self._refresh_timer = asyncio.create_task(self._refresh_later(delay))
+
+    async def _refresh_later(self, delay: float):
+        try:
+            await asyncio.sleep(delay)
+            # Отвязываемся от таймера, чтобы _schedule_refresh не отменил сам себя
+            self._refresh_timer = None
+            await self.refresh()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"GigaChat background token refresh failed: {e}")
+
+    async def _fetch(self) -> Optional[tuple]:
+        """Запрос нового токена: (access_token, expires_at в секундах epoch)"""
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Accept': 'application/json',
+            'RqUID': str(uuid.uuid4()),
+            'Authorization': f'Basic {Config.GIGACHAT_AUTH_KEY}'
+        }
+        
+        data = {
+            'scope': Config.GIGACHAT_SCOPE
+        }
+        
+        started = time.monotonic()
+        status = "error"
+        try:
+            async with self.client.session.post(
+                GIGACHAT_AUTH_URL,
+                headers=headers,
+                data=data,
+                timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                status = str(response.status)
+                if response.status != 200:
+                    logger.error(f"GigaChat auth failed: {response.status}")
+                    return None
+                
+                json_response = await response.json()
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.error("GigaChat auth timeout")
+            return None
+        except Exception as e:
+            status = "error"
+            logger.error(f"GigaChat auth error: {str(e)}")
+            return None
+        finally:
+            elapsed = time.monotonic() - started
+            GIGACHAT_SECONDS.observe(elapsed, call="auth", status=status)
+            record_span("gigachat", "auth", elapsed)
+
+        token = json_response.get("access_token")
+        if not token:
+            return None
+        # expires_at приходит в миллисекундах
+        expires_at = json_response.get("expires_at")
+        expires_at = expires_at / 1000 if expires_at else time.time() + self.DEFAULT_TTL
+        return token, expires_at
+
+
 class TarotInterpreter:
     _card_meanings: Dict[str, Any] = {}
+    # (название, перевёрнута) -> готовый текст для get_card_meaning
+    _rendered_meanings: Dict[tuple, str] = {}
+    _client: Optional[GigaChatClient] = None
+    _tokens: Optional[GigaChatTokenManager] = None
+    _breaker = CircuitBreaker(
+        window=Config.GIGACHAT_BREAKER_WINDOW,
+        min_calls=Config.GIGACHAT_BREAKER_MIN_CALLS,
+        error_rate=Config.GIGACHAT_BREAKER_ERROR_RATE,
+        cooldown=Config.GIGACHAT_BREAKER_COOLDOWN
+    )
+    # Полный ответ и первый фрагмент потока — разные задержки, поэтому два трекера
+    _timeouts = AdaptiveTimeout(Config.GIGACHAT_TIMEOUT_MIN, Config.INTERPRETATION_TIMEOUT)
+    _first_chunk_timeouts = AdaptiveTimeout(Config.GIGACHAT_TIMEOUT_MIN, Config.INTERPRETATION_TIMEOUT)
+    # Ключ промпта -> вызов GigaChat, который сейчас выполняется
+    _inflight: Dict[str, _Flight] = {}
+    _coalesced_hits = 0
+    _coalesced_misses = 0
+
+    @classmethod
+    def available(cls) -> bool:
+        """False, пока автомат GigaChat открыт и вызовы отклоняются сразу"""
+        return cls._breaker.state != CircuitBreaker.OPEN
+
+    @classmethod
+    def client(cls) -> GigaChatClient:
+        """HTTP-клиент GigaChat (создаётся один раз)"""
+        if cls._client is None:
+            cls._client = GigaChatClient(
+                limit=Config.GIGACHAT_POOL_LIMIT,
+                limit_per_host=Config.GIGACHAT_POOL_PER_HOST,
+                dns_ttl=Config.GIGACHAT_DNS_TTL,
+                keepalive_timeout=Config.GIGACHAT_KEEPALIVE
+            )
+            cls._tokens = GigaChatTokenManager(cls._client)
+        return cls._client
+
+    @classmethod
+    async def startup(cls):
+        """Создание сессии и прогрев токена при запуске бота"""
+        cls.client().session
+        await cls._tokens.get_token()
+
+    @classmethod
+    async def shutdown(cls):
+        """Закрытие сессии и фоновых задач при остановке бота"""
+        if cls._tokens is not None:
+            await cls._tokens.close()
+        if cls._client is not None:
+            await cls._client.close()
+        cls._client = None
+        cls._tokens = None
     
     @classmethod
     async def load_meanings(cls):
@@ -28,6 +366,12 @@ class TarotInterpreter:
                 try:
                     with open(path, "r", encoding="utf-8") as f:
                         cls._card_meanings = json.load(f)
+                    cls._rendered_meanings = {
+                        (card_name, is_reversed): cls._render_meaning(card_name, card_data, is_reversed)
+                        for card_name, card_data in cls._card_meanings.items()
+                        for is_reversed in (False, True)
+                        if card_data
+                    }
                     logger.info(f"Card meanings loaded from {path}")
                     return
                 except FileNotFoundError:
@@ -38,60 +382,19 @@ class TarotInterpreter:
         except Exception as e:
             logger.error(f"Error loading card meanings: {e}")
             cls._card_meanings = {} 
+            cls._rendered_meanings = {}
 
 
-    @staticmethod
-    async def get_access_token() -> Optional[str]:
-        """Получение токена доступа для GigaChat API"""
-        url = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
-        
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'Accept': 'application/json',
-            'RqUID': str(uuid.uuid4()),
-            'Authorization': f'Basic {Config.GIGACHAT_AUTH_KEY}'
-        }
-        
-        data = {
-            'scope': Config.GIGACHAT_SCOPE
-        }
-        
-        try:
-            ssl_context = ssl.create_default_context(cafile=str(Config.SSL_CERT_PATH))
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url,
-                    headers=headers,
-                    data=data,
-                    ssl=ssl_context,
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status != 200:
-                        logger.error(f"GigaChat auth failed: {response.status}")
-                        return None
-                    
-                    json_response = await response.json()
-                    return json_response.get("access_token")
-        except Exception as e:
-            logger.error(f"GigaChat auth error: {str(e)}")
-            return None
+    @classmethod
+    async def get_access_token(cls) -> Optional[str]:
+        """Получение токена доступа для GigaChat API (из кэша)"""
+        cls.client()
+        return await cls._tokens.get_token()
 
     @staticmethod
-    async def generate_interpretation(question: str, situation: str, cards: list) -> str:
-        """Генерация интерпретации расклада"""
-        token = await TarotInterpreter.get_access_token()
-        if not token:
-            return "Не удалось получить токен для доступа к GigaChat."
-
-        url = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'Authorization': f'Bearer {token}'
-        }
-
-        prompt = f"""Ты опытный таролог (Таро Уэйта), даёшь структурированные, краткие и понятные разборы без мистики и эзотерики.
+    def build_prompt(question: str, situation: str, cards: list) -> str:
+        """Промпт для интерпретации расклада"""
+        return f"""Ты опытный таролог (Таро Уэйта), даёшь структурированные, краткие и понятные разборы без мистики и эзотерики.
 
 Вопрос: "{question}".
 Ситуация: "{situation}".
@@ -121,35 +424,226 @@ class TarotInterpreter:
 — Никогда не используй эзотерические шаблоны, не упоминай "магические потоки", "высшие силы" и т.п.
 """
 
+    @classmethod
+    def build_payload(cls, question: str, situation: str, cards: list, stream: bool = False) -> dict:
         payload = {
             "model": "GigaChat",
-            "messages": [{"role": "user", "content": prompt}],
+            "messages": [{"role": "user", "content": cls.build_prompt(question, situation, cards)}],
             "temperature": 0.7,
             "max_tokens": 1024
         }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    @staticmethod
+    def prompt_key(question: str, situation: str, cards: list) -> str:
+        """Ключ промпта: текст без лишних пробелов, карты в порядке расклада.
+
+        Общий для объединения запросов и InterpretationCache — оба слоя
+        считают одинаковыми одни и те же промпты.
+        """
+        raw = json.dumps(
+            [PROMPT_VERSION, " ".join(question.split()), " ".join(situation.split()), list(cards)],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def coalescing_stats(cls) -> dict:
+        """Сколько запросов присоединилось к уже идущему вызову (hits) и сколько его начали (misses)"""
+        return {
+            "hits": cls._coalesced_hits,
+            "misses": cls._coalesced_misses,
+            "inflight": len(cls._inflight),
+        }
+
+    @classmethod
+    async def generate_interpretation(cls, question: str, situation: str, cards: list) -> str:
+        """Генерация интерпретации расклада.
+
+        Одновременные запросы с одинаковым промптом ждут один общий вызов
+        GigaChat. Отмена одного ждущего (например, по wait_for) не прерывает
+        вызов для остальных; вызов отменяется, только когда ушли все.
+        """
+        key = cls.prompt_key(question, situation, cards)
+        flight = cls._inflight.get(key)
+        if flight is None:
+            cls._coalesced_misses += 1
+            flight = _Flight(asyncio.create_task(cls._generate(question, situation, cards)))
+            cls._inflight[key] = flight
+            flight.task.add_done_callback(lambda task: cls._forget_flight(key, flight))
+        else:
+            cls._coalesced_hits += 1
 
+        # Вызов GigaChat пишет спаны в трассу того, кто его начал; остальным — время ожидания
+        joined_at = time.monotonic() if flight.waiters else None
+        flight.waiters += 1
         try:
-            ssl_context = ssl.create_default_context(cafile=str(Config.SSL_CERT_PATH))
-            
-            async with aiohttp.ClientSession() as session:
+            return await asyncio.shield(flight.task)
+        finally:
+            if joined_at is not None:
+                record_span("gigachat", "coalesced_wait", time.monotonic() - joined_at)
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Убираем вызов сразу: новый запрос не должен присоединиться к отменяемой задаче
+                cls._forget_flight(key, flight)
+                flight.task.cancel()
+
+    @classmethod
+    def _forget_flight(cls, key: str, flight: _Flight):
+        if cls._inflight.get(key) is flight:
+            del cls._inflight[key]
+
+    @staticmethod
+    def _observe(call: str, status: str, started: Optional[float]):
+        if started is not None:
+            elapsed = time.monotonic() - started
+            GIGACHAT_SECONDS.observe(elapsed, call=call, status=status)
+            record_span("gigachat", call, elapsed)
+
+    @classmethod
+    async def _generate(cls, question: str, situation: str, cards: list) -> str:
+        if not cls._breaker.allow():
+            GIGACHAT_REJECTED.inc()
+            return ERROR_UNAVAILABLE
+
+        healthy = None
+        timeout = cls._timeouts.get(len(cards))
+        started, status = None, "error"
+        try:
+            token = await cls.get_access_token()
+            if not token:
+                healthy = False
+                return ERROR_NO_TOKEN
+
+            payload = cls.build_payload(question, situation, cards)
+            session = cls.client().session
+            for attempt in range(2):
+                headers = {
+                    'Content-Type': 'application/json',
+                    'Accept': 'application/json',
+                    'Authorization': f'Bearer {token}'
+                }
+                started = time.monotonic()
                 async with session.post(
-                    url, 
+                    GIGACHAT_COMPLETIONS_URL, 
                     headers=headers, 
                     json=payload, 
-                    ssl=ssl_context,
-                    timeout=aiohttp.ClientTimeout(total=30)
+                    timeout=aiohttp.ClientTimeout(total=timeout)
                 ) as response:
+                    status = str(response.status)
                     if response.status == 200:
                         data = await response.json()
+                        healthy = True
+                        cls._timeouts.observe(len(cards), time.monotonic() - started)
                         return data.get('choices', [{}])[0].get('message', {}).get('content', '')
+                    if response.status == 401 and attempt == 0:
+                        # Токен отозван или истёк раньше срока — обновляем и повторяем один раз
+                        logger.warning("GigaChat returned 401, refreshing token")
+                        cls._observe("completion", status, started)
+                        started = None
+                        cls._tokens.invalidate()
+                        token = await cls._tokens.refresh()
+                        if not token:
+                            healthy = False
+                            return ERROR_NO_TOKEN
+                        continue
                     logger.error(f"GigaChat API error: {await response.text()}")
-                    return "Ошибка при генерации интерпретации"
+                    # 5xx и 429 — сервис лежит или перегружен; прочие ответы говорят о нашем запросе
+                    healthy = response.status < 500 and response.status != 429
+                    return ERROR_API
         except asyncio.TimeoutError:
-            logger.error("Timeout generating interpretation")
-            return "Время генерации истекло, попробуйте позже"
+            healthy = False
+            status = "timeout"
+            cls._timeouts.observe_timeout(len(cards))
+            logger.error(f"Timeout generating interpretation ({timeout:.1f}s)")
+            return ERROR_TIMEOUT
         except Exception as e:
+            healthy = False
+            status = "error"
             logger.error(f"Request error: {str(e)}")
-            return "Ошибка подключения к серверу"
+            return ERROR_CONNECTION
+        finally:
+            cls._breaker.record(healthy)
+            cls._observe("completion", status, started)
+
+    @classmethod
+    async def stream_interpretation(cls, question: str, situation: str, cards: list) -> AsyncIterator[str]:
+        """Потоковая генерация (SSE, stream: true): отдаёт фрагменты текста по мере готовности"""
+        if not cls._breaker.allow():
+            GIGACHAT_REJECTED.inc()
+            raise GigaChatError(ERROR_UNAVAILABLE)
+
+        healthy = None
+        started, status = None, "error"
+        # Ожидание фрагмента ограничено по p95 задержки первого фрагмента, вся генерация — GIGACHAT_STREAM_TIMEOUT
+        chunk_timeout = cls._first_chunk_timeouts.get(len(cards))
+        first_chunk = True
+        try:
+            token = await cls.get_access_token()
+            if not token:
+                healthy = False
+                raise GigaChatError(ERROR_NO_TOKEN)
+
+            payload = cls.build_payload(question, situation, cards, stream=True)
+            session = cls.client().session
+            for attempt in range(2):
+                headers = {
+                    'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream',
+                    'Authorization': f'Bearer {token}'
+                }
+                started = time.monotonic()
+                async with session.post(
+                    GIGACHAT_COMPLETIONS_URL,
+                    headers=headers,
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(
+                        total=Config.GIGACHAT_STREAM_TIMEOUT,
+                        sock_read=chunk_timeout
+                    )
+                ) as response:
+                    status = str(response.status)
+                    if response.status == 401 and attempt == 0:
+                        logger.warning("GigaChat returned 401, refreshing token")
+                        cls._observe("stream", status, started)
+                        started = None
+                        cls._tokens.invalidate()
+                        token = await cls._tokens.refresh()
+                        if not token:
+                            healthy = False
+                            raise GigaChatError(ERROR_NO_TOKEN)
+                        continue
+                    if response.status != 200:
+                        healthy = response.status < 500 and response.status != 429
+                        raise GigaChatError(f"GigaChat API error {response.status}: {await response.text()}")
+
+                    async for raw_line in response.content:
+                        line = raw_line.decode("utf-8").strip()
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        chunk = json.loads(data)
+                        content = chunk.get('choices', [{}])[0].get('delta', {}).get('content')
+                        if content:
+                            if first_chunk:
+                                first_chunk = False
+                                cls._first_chunk_timeouts.observe(len(cards), time.monotonic() - started)
+                            yield content
+                    healthy = True
+                    return
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            healthy = False
+            status = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            if first_chunk:
+                cls._first_chunk_timeouts.observe_timeout(len(cards))
+            raise
+        finally:
+            cls._breaker.record(healthy)
+            cls._observe("stream", status, started)
 
     @classmethod
     async def get_card_meaning(cls, card_name: str, is_reversed: bool = False) -> str:
@@ -157,10 +651,13 @@ class TarotInterpreter:
         if not cls._card_meanings:
             await cls.load_meanings()
         
-        card_data = cls._card_meanings.get(card_name)
-        if not card_data:
+        text = cls._rendered_meanings.get((card_name, is_reversed))
+        if text is None:
             return f"🔮 Карта '{card_name}' не найдена в базе данных."
-        
+        return text
+
+    @staticmethod
+    def _render_meaning(card_name: str, card_data: dict, is_reversed: bool) -> str:
         category = card_data.get("category", "Неизвестная категория")
         meaning = card_data.get("meaning", "Нет данных")
         upright = card_data.get("upright", "Нет данных")
@@ -186,4 +683,14 @@ class TarotInterpreter:
             if query_lower in card_name.lower():
                 results.append((card_name, card_data.get("category", "Неизвестно")))
         
-        return results
\ No newline at end of file
+        return results
+
+
+GIGACHAT_CIRCUIT_STATE.set_function(lambda: {
+    (state,): int(TarotInterpreter._breaker.state == state)
+    for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)
+})
+GIGACHAT_COALESCED.set_function(lambda: {
+    ("hit",): TarotInterpreter._coalesced_hits,
+    ("miss",): TarotInterpreter._coalesced_misses,
+})
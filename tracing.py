@@ -0,0 +1,68 @@
+import json
+import logging
+from contextvars import ContextVar, Token
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """Спаны одного апдейта или фонового задания: (тип, имя, длительность) для БД, GigaChat и Bot API"""
+
+    __slots__ = ("handler", "update_id", "fields", "spans")
+
+    def __init__(self, handler: str, update_id: Optional[int], **fields):
+        self.handler = handler
+        self.update_id = update_id
+        self.fields = fields
+        self.spans: List[Tuple[str, str, float]] = []
+
+    def breakdown(self, total: float) -> dict:
+        """Сводка по спанам: сколько раз и сколько миллисекунд на каждый тип:имя"""
+        groups: Dict[str, list] = {}
+        for kind, name, seconds in self.spans:
+            group = groups.setdefault(f"{kind}:{name}", [0, 0.0])
+            group[0] += 1
+            group[1] += seconds
+        # Вложенные (хелпер БД внутри хелпера) и параллельные спаны могут дать в сумме больше total
+        spent = sum(seconds for _, _, seconds in self.spans)
+        return {
+            "update_id": self.update_id,
+            "handler": self.handler,
+            **self.fields,
+            "total_ms": round(total * 1000, 1),
+            "spans": {
+                key: {"count": count, "ms": round(seconds * 1000, 1)}
+                for key, (count, seconds) in sorted(groups.items(), key=lambda item: -item[1][1])
+            },
+            "other_ms": round(max(total - spent, 0) * 1000, 1),
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("tarotbot_trace", default=None)
+
+
+def start_trace(handler: str, update_id: Optional[int], **fields) -> Tuple[Trace, Token]:
+    trace = Trace(handler, update_id, **fields)
+    return trace, _current.set(trace)
+
+
+def finish_trace(trace: Trace, token: Token, total: float, threshold: Optional[float] = None,
+                 label: str = "update"):
+    """Закрывает трассу; дольше порога (по умолчанию SLOW_UPDATE_SECONDS) — разбивка в лог"""
+    _current.reset(token)
+    if total >= (Config.SLOW_UPDATE_SECONDS if threshold is None else threshold):
+        logger.warning(f"Slow {label}: {json.dumps(trace.breakdown(total), ensure_ascii=False)}")
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def record_span(kind: str, name: str, seconds: float):
+    """Добавляет спан в текущую трассу (апдейта или задания); вне трассы ничего не делает"""
+    trace = _current.get()
+    if trace is not None:
+        trace.spans.append((kind, name, seconds))